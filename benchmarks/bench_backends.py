@@ -0,0 +1,106 @@
+import argparse, glob, json, os, time, numpy as np
+from capacity_estimator.backends import BACKENDS
+from capacity_estimator.image_io import IMAGE_EXTS
+from capacity_estimator.image_io import read_image
+from capacity_estimator.masks import YOLOMaskExtractor
+from capacity_estimator.video import mask_iou
+def load_frames(images, limit):
+    if images:
+        paths=sorted(p for p in glob.glob(os.path.join(images,"**","*"), recursive=True) if p.lower().endswith(IMAGE_EXTS))[:limit]
+        return [(os.path.basename(p), read_image(p)[1]) for p in paths]
+    from bench_synthetic import PROFILES, render
+    rng=np.random.default_rng(0)
+    return [(f"{p}_{a}", render(p,(1280,960),a,False,rng)[0]) for p in PROFILES for a in (0,15)][:limit]
+def box_iou(a, b):
+    x0,y0=np.maximum(a[:,None,:2],b[None,:,:2]).transpose(2,0,1)
+    x1,y1=np.minimum(a[:,None,2:],b[None,:,2:]).transpose(2,0,1)
+    inter=np.clip(x1-x0,0,None)*np.clip(y1-y0,0,None)
+    area=lambda r: (r[:,2]-r[:,0])*(r[:,3]-r[:,1])
+    return inter/(area(a)[:,None]+area(b)[None,:]-inter+1e-9)
+def detections(res):
+    if res.boxes is None or len(res.boxes)==0:
+        return np.zeros((0,4)), np.zeros(0,int), np.zeros(0)
+    b=res.boxes
+    return b.xyxy.cpu().numpy(), b.cls.cpu().numpy().astype(int), b.conf.cpu().numpy()
+def agreement(ref, out):
+    # greedy same-class matching at box IoU >= 0.5: (matched, ref count, out count, |conf diff| of matches)
+    (rb,rc,rs),(ob,oc,os_)=ref,out
+    if len(rb)==0 or len(ob)==0:
+        return 0, len(rb), len(ob), []
+    iou=box_iou(rb,ob)*(rc[:,None]==oc[None,:])
+    diffs=[]
+    for i in np.argsort(-rs):
+        j=int(np.argmax(iou[i]))
+        if iou[i,j]>=0.5:
+            iou[:,j]=-1
+            diffs.append(abs(float(rs[i])-float(os_[j])))
+    return len(diffs), len(rb), len(ob), diffs
+def run_variant(weights, variant, frames, args):
+    backend,int8=variant
+    opts={"backend":backend, "imgsz":args.imgsz, "int8":int8, "calib_dir":args.calib_dir, "export_dir":args.export_dir}
+    ex=YOLOMaskExtractor(weights, conf=args.conf, imgsz=args.imgsz, backend=opts)
+    t0=time.perf_counter(); model=ex.model; load_s=time.perf_counter()-t0
+    for _,f in frames[:args.warmup]:
+        model.predict(f, imgsz=args.imgsz, conf=args.conf, iou=0.5, verbose=False)
+    out=[]
+    for name,f in frames:
+        ts=[]
+        for _ in range(args.repeat):
+            t=time.perf_counter()
+            res=model.predict(f, imgsz=args.imgsz, conf=args.conf, iou=0.5, verbose=False)[0]
+            ts.append((time.perf_counter()-t)*1000)
+        try:
+            roi,off,_=ex._postprocess(res, f.shape[:2])
+            m=(roi,off)
+        except Exception:
+            m=None
+        out.append({"name":name, "ms":ts, "det":detections(res), "mask":m})
+    return load_s, out
+def main():
+    ap=argparse.ArgumentParser(description="YOLO inference backends: latency and agreement with the torch reference")
+    ap.add_argument("--weights", type=str, default=None, help="default: YOLO_MODEL")
+    ap.add_argument("--images", type=str, default=None, help="directory of test images (default: synthetic renders)")
+    ap.add_argument("--limit", type=int, default=50)
+    ap.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    ap.add_argument("--int8", action="store_true", help="also benchmark INT8 exports of the non-torch backends")
+    ap.add_argument("--calib-dir", type=str, default=None, help="calibration images for --int8")
+    ap.add_argument("--export-dir", type=str, default=None)
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--conf", type=float, default=0.25)
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", type=str, default=None, help="write the report rows to this file")
+    args=ap.parse_args()
+    if args.int8 and not args.calib_dir:
+        ap.error("--int8 needs --calib-dir")
+    from capacity_estimator.config import get_settings
+    weights=args.weights or get_settings().yolo_model
+    frames=load_frames(args.images, args.limit)
+    variants=[("torch",False)]+[(b,False) for b in args.backends if b!="torch"]+([(b,True) for b in args.backends if b!="torch"] if args.int8 else [])
+    ref=None; rows=[]
+    print(f"{len(frames)} images, imgsz {args.imgsz}, weights {weights}\n")
+    print(f"{'backend':<14} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>7} {'speedup':>8} {'mask IoU':>9} {'min IoU':>8} {'det match':>10} {'conf MAE':>9}")
+    for v in variants:
+        label=v[0]+("-int8" if v[1] else "")
+        try:
+            load_s,out=run_variant(weights, v, frames, args)
+        except Exception as e:
+            print(f"{label:<14} failed: {e}")
+            rows.append({"backend":label, "error":str(e)})
+            continue
+        ms=np.array([min(o["ms"]) for o in out])
+        row={"backend":label, "load_s":load_s, "p50_ms":float(np.percentile(ms,50)), "p95_ms":float(np.percentile(ms,95)), "img_per_s":1000.0/float(ms.mean())}
+        if ref is None:
+            ref=out; base=row["p50_ms"]
+        ious=[mask_iou(o["mask"],r["mask"]) if o["mask"] and r["mask"] else float(o["mask"] is r["mask"]) for o,r in zip(out,ref)]
+        agr=[agreement(r["det"],o["det"]) for o,r in zip(out,ref)]
+        matched=sum(a[0] for a in agr); total=max(1,sum(max(a[1],a[2]) for a in agr))
+        diffs=[d for a in agr for d in a[3]]
+        row.update({"speedup":base/row["p50_ms"], "mask_iou_mean":float(np.mean(ious)), "mask_iou_min":float(np.min(ious)), "det_match":matched/total, "conf_mae":float(np.mean(diffs)) if diffs else 0.0})
+        rows.append(row)
+        print(f"{label:<14} {load_s:>7.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['img_per_s']:>7.1f} {row['speedup']:>7.2f}x {row['mask_iou_mean']:>9.4f} {row['mask_iou_min']:>8.4f} {100*row['det_match']:>9.1f}% {row['conf_mae']:>9.4f}")
+    if args.json:
+        with open(args.json,"w") as f:
+            json.dump(rows,f,indent=2)
+if __name__=="__main__":
+    main()
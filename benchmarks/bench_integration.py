@@ -0,0 +1,52 @@
+import argparse, math, time, cv2, numpy as np
+from capacity_estimator.geometry import VolumeIntegrator
+def loop_integrate_mm(mask, mm_per_px, wall_mm=0.0):
+    # reference: the original per-row Python loop
+    m=(mask>0).astype(np.uint8)
+    rows=np.where(m.any(axis=1))[0]
+    top,bot=rows[0],rows[-1]
+    vol=0.0
+    for y in range(top,bot+1):
+        cols=np.where(m[y]>0)[0]
+        if cols.size<2:
+            continue
+        w=cols[-1]-cols[0]+1
+        r=max((w/2.0)*mm_per_px-wall_mm,0.0)
+        vol+=math.pi*(r**2)*mm_per_px
+    return vol,(bot-top+1)*mm_per_px
+def bottle_mask(h, w, rng):
+    m=np.zeros((h,w),np.uint8)
+    cx=w//2; top=int(h*0.05); bot=int(h*0.95)
+    body=int(w*rng.uniform(0.15,0.3)); neck=int(body*0.35)
+    shoulder=top+int((bot-top)*0.3)
+    pts=[(cx-neck,top),(cx+neck,top),(cx+neck,shoulder-(bot-top)//10),(cx+body,shoulder),(cx+body,bot),(cx-body,bot),(cx-body,shoulder),(cx-neck,shoulder-(bot-top)//10)]
+    cv2.fillPoly(m,[np.array(pts,np.int32)],1)
+    return m
+def timeit(fn, repeat):
+    ts=[]
+    for _ in range(repeat):
+        t0=time.perf_counter(); fn(); ts.append(time.perf_counter()-t0)
+    return float(np.median(ts))*1000
+def main():
+    ap=argparse.ArgumentParser(description="VolumeIntegrator: vectorized vs per-row loop")
+    ap.add_argument("--sizes", type=str, default="480x640,1512x2016,3024x4032")
+    ap.add_argument("--batch", type=int, default=16)
+    ap.add_argument("--repeat", type=int, default=5)
+    args=ap.parse_args()
+    rng=np.random.default_rng(0)
+    intg=VolumeIntegrator()
+    print(f"{'size':>12} {'loop ms':>10} {'vec ms':>10} {'speedup':>8} {'batch ms/img':>13} {'max rel err':>12}")
+    for s in args.sizes.split(","):
+        w,h=map(int,s.split("x"))
+        masks=[bottle_mask(h,w,rng) for _ in range(args.batch)]
+        t_loop=timeit(lambda: loop_integrate_mm(masks[0],0.1,1.0), args.repeat)
+        # per image over the same masks the batch sees, so the two columns compare directly
+        t_vec=timeit(lambda: [intg.integrate_mm(m,0.1,1.0) for m in masks], args.repeat)/len(masks)
+        stack=np.stack(masks)
+        t_batch=timeit(lambda: intg.integrate_batch(stack,0.1,1.0), args.repeat)/len(masks)
+        ref=np.array([loop_integrate_mm(m,0.1,1.0)[0] for m in masks])
+        vb,_=intg.integrate_batch(stack,0.1,1.0)
+        err=float(np.max(np.abs(vb-ref)/ref))
+        print(f"{s:>12} {t_loop:10.2f} {t_vec:10.2f} {t_loop/t_vec:8.1f} {t_batch:13.2f} {err:12.2e}")
+if __name__=="__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse, os, re, subprocess, sys, time
+from collections import defaultdict
+TARGETS=["capacity_estimator.config","capacity_estimator.pipeline","capacity_estimator.cli"]
+LINE=re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+def import_profile(target, env):
+    # -X importtime reports self/cumulative microseconds per module; indentation encodes nesting
+    p=subprocess.run([sys.executable,"-X","importtime","-c",f"import {target}"], capture_output=True, text=True, env=env)
+    if p.returncode!=0:
+        raise RuntimeError(p.stderr.strip().splitlines()[-1])
+    per_pkg=defaultdict(int)
+    total=0
+    for line in p.stderr.splitlines():
+        m=LINE.match(line)
+        if not m:
+            continue
+        self_us,cum_us,indent,mod=int(m.group(1)),int(m.group(2)),len(m.group(3)),m.group(4)
+        per_pkg[mod.split(".")[0]]+=self_us
+        if indent==1:
+            total+=cum_us
+    return total, per_pkg
+def wall_time(target, env, repeat):
+    ts=[]
+    for _ in range(repeat):
+        t0=time.perf_counter()
+        subprocess.run([sys.executable,"-c",f"import {target}"], check=True, env=env)
+        ts.append(time.perf_counter()-t0)
+    return sorted(ts)[len(ts)//2]
+def main():
+    ap=argparse.ArgumentParser(description="Cold-start import cost of capacity_estimator entry points")
+    ap.add_argument("--targets", nargs="+", default=TARGETS)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10)
+    args=ap.parse_args()
+    env=dict(os.environ)
+    src=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","src")
+    env["PYTHONPATH"]=os.pathsep.join([src, env.get("PYTHONPATH","")])
+    base=wall_time("sys", env, args.repeat)
+    print(f"interpreter baseline: {base*1000:.1f} ms")
+    for t in args.targets:
+        try:
+            total,per_pkg=import_profile(t, env)
+        except RuntimeError as e:
+            print(f"\n{t}: import failed ({e})")
+            continue
+        wall=wall_time(t, env, args.repeat)
+        print(f"\n{t}: wall {wall*1000:.1f} ms (+{(wall-base)*1000:.1f} over baseline), imports {total/1000:.1f} ms")
+        for pkg,us in sorted(per_pkg.items(), key=lambda kv:-kv[1])[:args.top]:
+            print(f"  {pkg:<28} {us/1000:8.1f} ms")
+        heavy=[m for m in ("ultralytics","torch","google") if m in per_pkg]
+        print(f"  heavy backends loaded: {', '.join(heavy) if heavy else 'none'}")
+if __name__=="__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse, json, sys, math, time, tracemalloc, cv2, numpy as np
+from capacity_estimator.masks import ContourMaskExtractor
+from capacity_estimator.geometry import RotationAligner, VolumeIntegrator
+from capacity_estimator.scale import ArucoScaleEstimator
+MARKER_MM=40.0
+# radius profiles r(t) in mm for t in [0,1] from base to top, with total height in mm
+PROFILES={
+    "cylinder": (lambda t: np.full_like(t, 35.0), 180.0),
+    "frustum": (lambda t: 40.0-15.0*t, 150.0),
+    "bottle": (lambda t: np.where(t<0.6, 38.0, np.where(t<0.8, 38.0-26.0*(t-0.6)/0.2, 12.0)), 240.0),
+}
+def true_volume_mm3(profile, n=200001):
+    r,h=PROFILES[profile]
+    t=np.linspace(0,1,n)
+    return float(np.trapezoid(math.pi*r(t)**2, t)*h) if hasattr(np,"trapezoid") else float(np.trapz(math.pi*r(t)**2, t)*h)
+def render(profile, size, angle_deg, with_aruco, rng, noise=0.0):
+    w,h=size
+    r,height_mm=PROFILES[profile]
+    mm_per_px=height_mm/(0.6*min(w,h))
+    t=np.linspace(0,1,512)
+    rp=r(t)/mm_per_px; zp=(0.5-t)*height_mm/mm_per_px
+    pts=np.concatenate([np.stack([rp,zp],1), np.stack([-rp[::-1],zp[::-1]],1)])
+    a=math.radians(angle_deg)
+    R=np.array([[math.cos(a),-math.sin(a)],[math.sin(a),math.cos(a)]])
+    pts=pts@R.T+np.array([w*0.55,h*0.5])
+    img=np.full((h,w,3),215,np.uint8)
+    poly=np.round(pts*16).astype(np.int32)
+    cv2.fillPoly(img,[poly],(60,70,80),lineType=cv2.LINE_AA,shift=4)
+    if with_aruco:
+        side=int(round(MARKER_MM/mm_per_px))
+        ad=cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_5X5_100)
+        mk=cv2.aruco.generateImageMarker(ad, 7, side)
+        q=max(side//4,4)
+        x0,y0=q*2,h-side-q*2
+        img[y0-q:y0+side+q, x0-q:x0+side+q]=255
+        img[y0:y0+side, x0:x0+side]=mk[...,None]
+    if noise>0:
+        img=(img.astype(np.float32)+rng.normal(0,noise,img.shape)).clip(0,255).astype(np.uint8)
+    return img, mm_per_px
+def measure(fn, repeat):
+    ts=[]; out=None
+    tracemalloc.start()
+    for _ in range(repeat):
+        t0=time.perf_counter(); out=fn(); ts.append((time.perf_counter()-t0)*1000)
+    _,peak=tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, ts, peak
+def pct(ts):
+    return {f"p{q}":float(np.percentile(ts,q)) for q in (50,95,99)}
+def run_case(profile, size, angle, with_aruco, repeat, rng, noise=0.0):
+    bgr,mpp=render(profile, size, angle, with_aruco, rng, noise)
+    truth=true_volume_mm3(profile)/1000.0
+    stages={}
+    contour=ContourMaskExtractor()
+    (roi,off,cnt),ts,peak=measure(lambda: contour.extract_bgr(bgr), repeat)
+    stages["contour"]=(ts,peak)
+    rot=RotationAligner()
+    (mask_r,ang,_),ts,peak=measure(lambda: rot.rotate_mask_roi(roi*255, off, cnt, bgr.shape, 20), repeat)
+    stages["rotation"]=(ts,peak)
+    intg=VolumeIntegrator()
+    (vmm3,_),ts,peak=measure(lambda: intg.integrate_mm(mask_r, mpp), repeat)
+    stages["integration"]=(ts,peak)
+    row={"profile":profile,"size":f"{size[0]}x{size[1]}","angle":angle,"truth_ml":truth,"volume_ml":vmm3/1000.0,"volume_err_pct":100.0*(vmm3/1000.0-truth)/truth,"rotation_err_deg":abs(((ang-angle)+90)%180-90)}
+    if with_aruco:
+        try:
+            aruco=ArucoScaleEstimator()
+            est,ts,peak=measure(lambda: aruco.estimate_mm_per_px(bgr, MARKER_MM), repeat)
+            stages["aruco"]=(ts,peak)
+            row["scale_err_pct"]=100.0*(est-mpp)/mpp
+            v_aruco,_=intg.integrate_mm(mask_r, est)
+            row["volume_err_aruco_pct"]=100.0*(v_aruco/1000.0-truth)/truth
+        except Exception as e:
+            row["aruco_error"]=str(e)
+    row["stages"]={k:{**pct(ts),"peak_mb":peak/2**20} for k,(ts,peak) in stages.items()}
+    return row
+def main():
+    ap=argparse.ArgumentParser(description="Synthetic solids of revolution: per-stage latency, memory and volume error")
+    ap.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    ap.add_argument("--sizes", type=str, default="640x480,2016x1512,4032x3024")
+    ap.add_argument("--angles", type=str, default="0,15,-30")
+    ap.add_argument("--aruco", action="store_true", help="draw an ArUco marker and benchmark ArucoScaleEstimator")
+    ap.add_argument("--noise", type=float, default=0.0, help="std-dev of additive Gaussian pixel noise")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", type=str, default=None, help="write all rows to this file")
+    ap.add_argument("--max-volume-err", type=float, default=10.0, help="exit non-zero if any |volume error| exceeds this (%%)")
+    ap.add_argument("--max-rotation-err", type=float, default=2.0, help="exit non-zero if any rotation error exceeds this (deg)")
+    args=ap.parse_args()
+    rng=np.random.default_rng(args.seed)
+    sizes=[tuple(map(int,s.split("x"))) for s in args.sizes.split(",")]
+    angles=[float(a) for a in args.angles.split(",")]
+    rows=[]
+    print(f"{'profile':<9} {'size':>10} {'angle':>6} {'vol err%':>9} {'rot err':>8} {'stage':<12} {'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8}")
+    for profile in args.profiles:
+        for size in sizes:
+            for angle in angles:
+                row=run_case(profile, size, angle, args.aruco, args.repeat, rng, args.noise)
+                rows.append(row)
+                for i,(stage,m) in enumerate(row["stages"].items()):
+                    head=f"{profile:<9} {row['size']:>10} {angle:>6.0f} {row['volume_err_pct']:>9.2f} {row['rotation_err_deg']:>8.2f}" if i==0 else " "*47
+                    print(f"{head} {stage:<12} {m['p50']:>8.2f} {m['p95']:>8.2f} {m['peak_mb']:>8.1f}")
+                if "aruco_error" in row:
+                    print(" "*47+f" aruco failed: {row['aruco_error']}")
+                elif args.aruco:
+                    print(" "*47+f" scale err {row['scale_err_pct']:.2f}%, volume err with aruco scale {row['volume_err_aruco_pct']:.2f}%")
+    errs=np.abs([r["volume_err_pct"] for r in rows])
+    print(f"\n{len(rows)} cases, |volume error| mean {errs.mean():.2f}% max {errs.max():.2f}%")
+    if args.json:
+        with open(args.json,"w") as f:
+            json.dump(rows,f,indent=2)
+    bad=[r for r in rows if abs(r["volume_err_pct"])>args.max_volume_err or r["rotation_err_deg"]>args.max_rotation_err]
+    for r in bad:
+        print(f"FAIL {r['profile']} {r['size']} angle {r['angle']:.0f}: volume err {r['volume_err_pct']:.2f}%, rotation err {r['rotation_err_deg']:.2f} deg", file=sys.stderr)
+    if bad:
+        sys.exit(f"{len(bad)} of {len(rows)} cases over --max-volume-err {args.max_volume_err}% / --max-rotation-err {args.max_rotation_err} deg")
+if __name__=="__main__":
+    main()
@@ -1,7 +1,7 @@
 import argparse
+import asyncio
 import json
 import re
-import subprocess
 import sys
 import os
 from google import genai
@@ -9,6 +9,15 @@ from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from typing import Optional
 
+from capacity_estimator.aio import ApiLimiter, get_limiter, limited_scale_fn
+from capacity_estimator.image_io import load_image
+from capacity_estimator.metrics import timed
+from capacity_estimator.pipeline import CapacityPipeline
+from food_density import DensityLookup, get_default_lookup
+from main import run_detection
+from server.food import find_main_food
+from server.yolo.yolo import YOLOModel
+
 class DensityEstimate(BaseModel):
     density_g_ml: float = Field(..., description="The estimated density in g/mL.")
     food_identified: str = Field(..., description="The common name of the food identified by the model.")
@@ -34,18 +43,15 @@ def extract_text_from_genai_response(response):
             pieces = []
     return "\n".join(pieces).strip()
 
-def get_food_density(food_name: str, client: genai.Client) -> float:
-    if not food_name:
-        print("-> [Gemini Query] No food name provided. Defaulting to 1.0 g/mL (water).")
-        return 1.0
-
+def query_food_density(food_name: str, client: genai.Client) -> Optional[float]:
     prompt = f"Provide the density (in g/mL) for this food item and return only JSON with keys: density_g_ml (number), food_identified (string), rationale (optional string). Food: {food_name}"
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-pro",
-            contents=[prompt]
-        )
+        with timed(None, "gemini_density"):
+            response = client.models.generate_content(
+                model="gemini-2.5-pro",
+                contents=[prompt]
+            )
         text = extract_text_from_genai_response(response)
         json_text_match = re.search(r"(\{[\s\S]*\})", text)
         if json_text_match:
@@ -56,8 +62,7 @@ def get_food_density(food_name: str, client: genai.Client) -> float:
             parsed = json.loads(json_text)
         except json.JSONDecodeError:
             print(f"-> [Gemini Query] Could not parse JSON from model response. Raw response:\n{text}")
-            print("-> Defaulting to 1.0 g/mL (water).")
-            return 1.0
+            return None
         if parsed:
             try:
                 dto = DensityEstimate(**parsed)
@@ -70,72 +75,140 @@ def get_food_density(food_name: str, client: genai.Client) -> float:
                 print(f"-> [Gemini Query] JSON parsed but did not match schema: {e}")
     except Exception as e:
         print(f"-> [Gemini Query] API call failed: {repr(e)}")
+    return None
+
+def get_food_density(food_name: str, client: Optional[genai.Client], lookup: Optional[DensityLookup] = None, fetch=None) -> float:
+    if not food_name:
+        print("-> [Gemini Query] No food name provided. Defaulting to 1.0 g/mL (water).")
+        return 1.0
+
+    lookup = lookup or get_default_lookup()
+    fetch = fetch or (lambda name: query_food_density(name, client) if client is not None else None)
+    density = lookup.get(food_name, fetch)
+    if density is not None:
+        return density
 
     print("-> Defaulting to 1.0 g/mL (water).")
     return 1.0
- 
-def run_food_detection(image_path: str):
-    command = [sys.executable, "main.py", "--image", image_path]
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True, encoding="utf-8")
-        output = result.stdout
-        json_match = re.search(r"--- Detection Results ---\s*(\{[\s\S]*\})", output, re.DOTALL)
-        if not json_match:
-            print("Error: Could not find '--- Detection Results ---' in main.py output.")
-            print(output)
-            return None, None
-        data = json.loads(json_match.group(1))
-        food_percentage = data.get("food_percentage")
-        if food_percentage is None:
-            print("Error: 'food_percentage' not in JSON output.")
-            return None, None
-        ignore_classes = {58.0, 31.0, 42.0, 70.0, 83.0, 25.0, 27.0, 22.0, 11.0, 8.0}
-        garbage_classes = {35.0}
-        main_food_name = None
-        max_food_area = 0
-        for obj in data.get("objects", []):
-            label = obj.get("label")
-            if label not in ignore_classes and label not in garbage_classes:
-                if obj.get("area", 0) > max_food_area:
-                    max_food_area = obj["area"]
-                    main_food_name = obj.get("label_name")
-        if main_food_name is None:
-            print("Warning: Could not identify the main food item.")
-        return food_percentage / 100.0, main_food_name
-    except subprocess.CalledProcessError as e:
-        print(f"Error running main.py: {e}")
-        print(getattr(e, "stderr", ""))
-        return None, None
-    except json.JSONDecodeError:
-        print("Error: Could not parse JSON from main.py output.")
+
+async def get_food_density_async(food_name: str, client: Optional[genai.Client], lookup: Optional[DensityLookup] = None, limiter: Optional[ApiLimiter] = None) -> float:
+    # get_food_density with the Gemini fallback behind the shared API limiter (timeout, retries, concurrency cap)
+    limiter = limiter or get_limiter()
+    loop = asyncio.get_running_loop()
+
+    def fetch(name):
+        if client is None:
+            return None
         try:
-            print(output)
-        except Exception:
-            pass
-        return None, None
+            return limiter.call_from_thread(loop, query_food_density, name, client, name="gemini_density", retry_if=lambda d: d is None)
+        except Exception as e:
+            print(f"-> [Gemini Query] Giving up on density lookup: {repr(e)}")
+            return None
+
+    return await asyncio.to_thread(get_food_density, food_name, None, lookup, fetch)
+
+def run_food_detection(image_path: str, yolo_model: YOLOModel, image=None):
+    try:
+        data = run_detection(image_path, yolo_model, image=image)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        print(f"Error running food detection: {e}")
+        return None, None
+    food_percentage = data.get("food_percentage")
+    if food_percentage is None:
+        print(f"Error: 'food_percentage' not in detection result ({data.get('error', 'unknown error')}).")
         return None, None
+    main_food_name = find_main_food(data)
+    if main_food_name is None:
+        print("Warning: Could not identify the main food item.")
+    return food_percentage / 100.0, main_food_name
 
-def run_volume_estimation(image_path: str):
-    command = [sys.executable, "-m", "capacity_estimator.cli", "--image", image_path, "--use-gemini"]
+def run_volume_estimation(image_path: str, pipeline: CapacityPipeline, use_gemini: bool = True, loaded=None, scale_fn=None):
+    # loaded: (bytes, bgr, decode_scale) from image_io.load_image, so the file is read and decoded once per run
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True, encoding="utf-8")
-        output = result.stdout
-        volume_match = re.search(r"Estimated volume: ([\d\.]+)\s*mL", output)
-        if not volume_match:
-            print("Error: Could not parse 'Estimated volume' from capacity_estimator output.")
-            print(output)
-            return None
-        volume_ml = float(volume_match.group(1))
-        return volume_ml
-    except subprocess.CalledProcessError as e:
+        if loaded is None:
+            loaded = load_image(image_path, pipeline.decode_max_side)
+        data, bgr, decode_scale = loaded
+        if bgr is None:
+            raise RuntimeError(f"Could not read image: {image_path}")
+        res = pipeline.process_frame(bgr, image_path, None, None, 0.0, None, 20, use_gemini, image_bytes=data, decode_scale=decode_scale, scale_fn=scale_fn)
+    except Exception as e:
         print(f"Error running capacity_estimator: {e}")
-        print(getattr(e, "stderr", ""))
         return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    if res["units"]["volume"] != "mL":
+        print(f"Error: capacity_estimator could not resolve a metric scale ({res['notes']}).")
         return None
+    return float(res["volume"])
+
+class FoodMassPipeline:
+    def __init__(self, client: Optional[genai.Client] = None, yolo_model: Optional[YOLOModel] = None, capacity_pipeline: Optional[CapacityPipeline] = None, use_gemini_scale: bool = True, density_lookup: Optional[DensityLookup] = None):
+        self.client = client
+        self.density_lookup = density_lookup or get_default_lookup()
+        self.yolo_model = yolo_model or YOLOModel()
+        if self.yolo_model.model is None:
+            raise RuntimeError("Model initialization failed.")
+        self.capacity_pipeline = capacity_pipeline or CapacityPipeline()
+        self.use_gemini_scale = use_gemini_scale
+
+    def _load(self, image_path: str):
+        try:
+            loaded = load_image(image_path, self.capacity_pipeline.decode_max_side)
+        except OSError as e:
+            return {"error": f"Could not read image: {e}"}
+        if loaded[1] is None:
+            return {"error": f"Could not decode image: {image_path}"}
+        return loaded
+
+    def process(self, image_path: str) -> dict:
+        loaded = self._load(image_path)
+        if isinstance(loaded, dict):
+            return loaded
+        food_percentage, food_name = run_food_detection(image_path, self.yolo_model, image=loaded[1])
+        if food_percentage is None:
+            return {"error": "Failed to get food detection data."}
+        total_volume_ml = run_volume_estimation(image_path, self.capacity_pipeline, self.use_gemini_scale, loaded)
+        if total_volume_ml is None:
+            return {"error": "Failed to get volume estimation.", "food_name": food_name, "food_percentage": food_percentage}
+        density_g_ml = get_food_density(food_name, self.client, self.density_lookup)
+        return self._result(food_name, food_percentage, total_volume_ml, density_g_ml)
+
+    async def process_async(self, image_path: str, limiter: Optional[ApiLimiter] = None) -> dict:
+        # Same result as process(), but the API calls overlap the CPU stages: the density lookup starts as soon as
+        # detection has a label and the Gemini scale request right after segmentation, while the other branch
+        # keeps running. All Gemini calls share the limiter (concurrency cap, per-call timeout, retries).
+        limiter = limiter or get_limiter()
+        loaded = await asyncio.to_thread(self._load, image_path)
+        if isinstance(loaded, dict):
+            return loaded
+
+        async def food_branch():
+            food_percentage, food_name = await asyncio.to_thread(run_food_detection, image_path, self.yolo_model, loaded[1])
+            if food_percentage is None:
+                return None, None, None
+            density_g_ml = await get_food_density_async(food_name, self.client, self.density_lookup, limiter)
+            return food_percentage, food_name, density_g_ml
+
+        scale_fn = limited_scale_fn(self.capacity_pipeline.gemini, asyncio.get_running_loop(), limiter)
+        (food_percentage, food_name, density_g_ml), total_volume_ml = await asyncio.gather(
+            food_branch(),
+            asyncio.to_thread(run_volume_estimation, image_path, self.capacity_pipeline, self.use_gemini_scale, loaded, scale_fn),
+        )
+        if food_percentage is None:
+            return {"error": "Failed to get food detection data."}
+        if total_volume_ml is None:
+            return {"error": "Failed to get volume estimation.", "food_name": food_name, "food_percentage": food_percentage}
+        return self._result(food_name, food_percentage, total_volume_ml, density_g_ml)
+
+    @staticmethod
+    def _result(food_name, food_percentage, total_volume_ml, density_g_ml) -> dict:
+        food_volume_ml = total_volume_ml * food_percentage
+        return {
+            "food_name": food_name,
+            "food_percentage": food_percentage,
+            "total_volume_ml": total_volume_ml,
+            "food_volume_ml": food_volume_ml,
+            "density_g_ml": density_g_ml,
+            "food_mass_g": food_volume_ml * density_g_ml,
+        }
 
 def main():
     parser = argparse.ArgumentParser(description="Calculate the total mass of food in an image.")
@@ -151,23 +224,21 @@ def main():
     except Exception as e:
         print(f"Error configuring Gemini API client: {e}")
         sys.exit(1)
-    food_percentage, food_name = run_food_detection(args.image)
-    if food_percentage is None:
-        print("Failed to get food detection data. Exiting.")
+    try:
+        pipeline = FoodMassPipeline(client=client)
+    except Exception as e:
+        print(f"Fatal: Could not load models. {e}")
         sys.exit(1)
-    print(f"-> Detected Food: '{food_name}'")
-    print(f"-> Detected Food Percentage: {food_percentage * 100:.2f}%")
-    total_volume_ml = run_volume_estimation(args.image)
-    if total_volume_ml is None:
-        print("Failed to get volume estimation. Exiting.")
+    res = asyncio.run(pipeline.process_async(args.image))
+    if "error" in res:
+        print(f"{res['error']} Exiting.")
         sys.exit(1)
-    print(f"-> Detected Total Volume: {total_volume_ml:.2f} mL")
-    food_volume_ml = total_volume_ml * food_percentage
-    print(f"-> Calculated Food Volume: {food_volume_ml:.2f} mL")
-    density_g_ml = get_food_density(food_name, client)
-    food_mass_g = food_volume_ml * density_g_ml
+    print(f"-> Detected Food: '{res['food_name']}'")
+    print(f"-> Detected Food Percentage: {res['food_percentage'] * 100:.2f}%")
+    print(f"-> Detected Total Volume: {res['total_volume_ml']:.2f} mL")
+    print(f"-> Calculated Food Volume: {res['food_volume_ml']:.2f} mL")
     print("\n--- FINAL RESULT ---")
-    print(f"Estimated food mass: {food_mass_g:.2f} g")
+    print(f"Estimated food mass: {res['food_mass_g']:.2f} g")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,193 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# Bulk densities (g/mL) of foods as they sit on a plate, keyed by normalized YOLO label name.
+FOOD_DENSITIES: Dict[str, float] = {
+    "rice": 0.86,
+    "fried rice": 0.73,
+    "biryani": 0.75,
+    "noodles": 0.6,
+    "pasta": 0.6,
+    "spaghetti": 0.6,
+    "bread": 0.27,
+    "roti": 0.55,
+    "chapati": 0.55,
+    "naan": 0.45,
+    "pizza": 0.6,
+    "burger": 0.55,
+    "sandwich": 0.45,
+    "salad": 0.3,
+    "lettuce": 0.15,
+    "vegetables": 0.55,
+    "broccoli": 0.37,
+    "carrot": 0.64,
+    "tomato": 0.95,
+    "cucumber": 0.95,
+    "potato": 0.77,
+    "mashed potato": 1.05,
+    "french fries": 0.45,
+    "fries": 0.45,
+    "chicken": 0.95,
+    "meat": 1.0,
+    "beef": 1.0,
+    "pork": 1.0,
+    "fish": 0.95,
+    "shrimp": 0.9,
+    "egg": 1.03,
+    "omelette": 0.8,
+    "tofu": 1.0,
+    "beans": 0.8,
+    "dal": 1.05,
+    "curry": 1.05,
+    "soup": 1.0,
+    "sauce": 1.1,
+    "yogurt": 1.06,
+    "cheese": 1.1,
+    "fruit": 0.9,
+    "apple": 0.8,
+    "banana": 0.95,
+    "orange": 0.9,
+    "watermelon": 0.95,
+    "cake": 0.45,
+    "dessert": 0.7,
+    "ice cream": 0.55,
+    "cookie": 0.6,
+    "corn": 0.72,
+    "peas": 0.7,
+    "mushroom": 0.45,
+    "sushi": 0.95,
+    "dumpling": 0.9,
+}
+
+
+def normalize_food_name(food_name: str) -> str:
+    return " ".join(food_name.strip().lower().replace("_", " ").replace("-", " ").split())
+
+
+def load_density_table(path: Optional[str] = None) -> Dict[str, float]:
+    table = dict(FOOD_DENSITIES)
+    path = path or os.getenv("DENSITY_TABLE_PATH")
+    if path and os.path.exists(path):
+        with open(path) as f:
+            table.update({normalize_food_name(k): float(v) for k, v in json.load(f).items()})
+    return table
+
+
+class DensityCache:
+    def __init__(self, path: str, ttl_s: float = 30 * 86400, max_entries: int = 10000):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS densities (food TEXT PRIMARY KEY, density REAL NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def get(self, food: str) -> Optional[float]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT density, created FROM densities WHERE food = ?", (food,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_s:
+                self._conn.execute("DELETE FROM densities WHERE food = ?", (food,))
+                return None
+            self._conn.execute("UPDATE densities SET accessed = ? WHERE food = ?", (now, food))
+            return float(row[0])
+
+    def put(self, food: str, density: float):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO densities VALUES (?, ?, ?, ?)", (food, float(density), now, now))
+            self._conn.execute("DELETE FROM densities WHERE created < ?", (now - self.ttl_s,))
+            self._conn.execute(
+                "DELETE FROM densities WHERE food IN (SELECT food FROM densities ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DensityLookup:
+    def __init__(self, table: Optional[Dict[str, float]] = None, cache: Optional[DensityCache] = None, lru_size: int = 256):
+        self.table = load_density_table() if table is None else table
+        self.cache = cache
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+
+    def _lru_get(self, food: str) -> Optional[float]:
+        with self._lock:
+            if food in self._lru:
+                self._lru.move_to_end(food)
+                return self._lru[food]
+        return None
+
+    def _lru_put(self, food: str, density: float):
+        with self._lock:
+            self._lru[food] = density
+            self._lru.move_to_end(food)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, food_name: str, fetch: Callable[[str], Optional[float]]) -> Optional[float]:
+        food = normalize_food_name(food_name)
+        if food in self.table:
+            return self.table[food]
+        density = self._lru_get(food)
+        if density is not None:
+            return density
+        if self.cache is not None:
+            density = self.cache.get(food)
+            if density is not None:
+                self._lru_put(food, density)
+                return density
+        # Merge concurrent misses for the same food into a single fetch.
+        with self._lock:
+            event = self._inflight.get(food)
+            leader = event is None
+            if leader:
+                event = self._inflight[food] = threading.Event()
+        if not leader:
+            event.wait()
+            return self._lru_get(food)
+        try:
+            density = fetch(food_name)
+            if density is not None:
+                self._lru_put(food, density)
+                if self.cache is not None:
+                    self.cache.put(food, density)
+            return density
+        finally:
+            with self._lock:
+                del self._inflight[food]
+            event.set()
+
+
+_default_lookup: Optional[DensityLookup] = None
+_default_lock = threading.Lock()
+
+
+def get_default_lookup() -> DensityLookup:
+    global _default_lookup
+    with _default_lock:
+        if _default_lookup is None:
+            cache = DensityCache(
+                os.getenv("DENSITY_CACHE_PATH", "outputs/density_cache.sqlite"),
+                ttl_s=float(os.getenv("DENSITY_CACHE_TTL_DAYS", "30")) * 86400,
+                max_entries=int(os.getenv("DENSITY_CACHE_MAX_ENTRIES", "10000")),
+            )
+            _default_lookup = DensityLookup(cache=cache)
+        return _default_lookup
@@ -1,118 +1,116 @@
-# from typing import Union
-# from fastapi import FastAPI
-# from fastapi.middleware.cors import CORSMiddleware
-
-# from routes import index
-# from routes.api import detect
-
-# app = FastAPI()
-
-# # Configure CORS
-# origins = ["*"]
-
-# app.add_middleware(
-#     CORSMiddleware,
-#     allow_origins=origins,
-#     allow_credentials=True,
-#     allow_methods=["*"],
-#     allow_headers=["*"],
-# )
-
-# app.include_router(index.router)
-# app.include_router(detect.router, prefix="/api")
-
-
 import argparse
 import sys
 import json
 import os
-from PIL import Image
-
+from typing import Optional
+import numpy as np
+
+from capacity_estimator.artifacts import MODES, ArtifactWriter, downscale
+from capacity_estimator.columnar import FORMATS, ColumnarWriter
+from capacity_estimator.config import get_settings
+from capacity_estimator.image_io import load_image
+from capacity_estimator.masks.yolo_seg import instance_rois
+from server.food import summarize_detection
 from server.yolo.yolo import YOLOModel
 
 def generate_clustering_image(result):
-    clustering_image_array = result.plot(boxes=False, labels=True, color_mode="class")
-    clustering_image_array_rgb = clustering_image_array[..., ::-1] 
-    clustering_image = Image.fromarray(clustering_image_array_rgb)
-    return clustering_image
-
-def run_detection(image_path: str, yolo_model: YOLOModel):
-    try:
-        image = Image.open(image_path)
-    except FileNotFoundError:
-        print(f"Error: Image file not found at {image_path}", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error: Could not open image. {e}", file=sys.stderr)
-        sys.exit(1)
+    # BGR array, ready for cv2.imwrite
+    return result.plot(boxes=False, labels=True, color_mode="class")
+
+def run_detection(image_path: str, yolo_model: YOLOModel, artifacts: Optional[ArtifactWriter] = None, output_dir: str = "outlines", image: Optional[np.ndarray] = None, return_masks: bool = False):
+    # image: an already decoded BGR frame (e.g. shared with the capacity pipeline); read from image_path otherwise
+    # return_masks adds summary["masks"]: one (roi, (x0, y0)) per entry of summary["objects"], in decoded pixels
+    if image is None:
+        try:
+            _, image, _ = load_image(image_path, get_settings().decode_max_side)
+        except FileNotFoundError:
+            print(f"Error: Image file not found at {image_path}", file=sys.stderr)
+            raise
+        if image is None:
+            print(f"Error: Could not decode image {image_path}.", file=sys.stderr)
+            raise ValueError(f"Could not decode image: {image_path}")
 
     print(f"Processing image: {image_path}...")
     
-    detected_objects, results = yolo_model.predict(image)
+    detections, results = yolo_model.predict_arrays(image)
 
     if results is None:
         print("Error: Error during object detection.", file=sys.stderr)
-        sys.exit(1)
-
-    output_dir = "outlines"
-    
-    os.makedirs(output_dir, exist_ok=True) 
-
-    output_image_path = os.path.join(output_dir, "output_image.jpg")
-    clustering_image_path = os.path.join(output_dir, "clustering_image.jpg")
-    
-    results[0].save(output_image_path)
-    clustering_image = generate_clustering_image(results[0])
-    clustering_image.save(clustering_image_path)
-
-    print(f"Saved detection image to: {output_image_path}")
-    print(f"Saved clustering image to: {clustering_image_path}")
-
-    garbage_classes = {35.0}
-    ignore_classes = {58.0, 31.0, 42.0, 70.0, 83.0, 25.0, 27.0, 22.0, 11.0, 8.0}
-    plate_area = 0
-    garbage_area = 0
-    food_area = 0
-
-    for obj in detected_objects:
-        if obj["label"] == 58.0:
-            plate_area += obj["area"]
-        elif obj["label"] in garbage_classes:
-            garbage_area += obj["area"]
-        elif obj["label"] not in ignore_classes:
-            food_area += obj["area"]
-
-    if plate_area == 0:
-        print("Error: No plate detected in the image.", file=sys.stderr)
-        return {"error": "No plate detected in the image"}
-
-    if plate_area > garbage_area:
-        food_percentage = (food_area / (plate_area - garbage_area)) * 100
-    else:
-        food_percentage = 0
-
-    food_percentage = min(max(food_percentage, 0), 100)
-    
-    return {
-        "food_percentage": round(food_percentage, 2),
-        "food_area": food_area,
-        "garbage_area": garbage_area,
-        "plate_area": plate_area,
-        "detected_objects_count": len(detected_objects),
-        "objects": detected_objects,
-    }
-
+        raise RuntimeError("Error during object detection.")
+
+    artifacts = artifacts or ArtifactWriter("sync")
+    if artifacts.sample():
+        result = results[0]
+
+        def render_detection():
+            img, _ = downscale(result.plot(), artifacts.preview_max_side)
+            return img
+
+        def render_clustering():
+            img, _ = downscale(generate_clustering_image(result), artifacts.preview_max_side)
+            return img
+
+        output_image_path = artifacts.submit(os.path.join(output_dir, "output_image.jpg"), render_detection)
+        clustering_image_path = artifacts.submit(os.path.join(output_dir, "clustering_image.jpg"), render_clustering)
+
+        for what, path in (("detection", output_image_path), ("clustering", clustering_image_path)):
+            if path is None:
+                print(f"Error: could not save {what} image.", file=sys.stderr)
+            elif artifacts.mode == "background":
+                print(f"Writing {what} image to: {path}")
+            else:
+                print(f"Saved {what} image to: {path}")
+
+    summary = summarize_detection(detections)
+    if return_masks and "objects" in summary:
+        summary["masks"] = instance_rois(results[0], image.shape)
+    if "error" in summary:
+        print(f"Error: {summary['error']}.", file=sys.stderr)
+    return summary
+
+def detection_worker(artifacts_mode: Optional[str] = "off", output_dir: str = "outlines"):
+    # factory for capacity_estimator.parallel.ParallelRunner(factory="main:detection_worker")
+    settings = get_settings()
+    model = YOLOModel()
+    if model.model is None:
+        raise RuntimeError("Model initialization failed.")
+    artifacts = ArtifactWriter.from_settings(settings, mode="sync" if artifacts_mode == "background" else artifacts_mode)
+
+    def run(bgr, path, image_bytes, decode_scale, mask_sink=None, **kw):
+        return run_detection(path, model, artifacts, output_dir=output_dir, image=bgr)
+
+    run.decode_max_side = settings.decode_max_side
+    return run
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run food percentage detection on an image.")
     parser.add_argument(
         "--image",
         type=str,
+        nargs="+",
         required=True,
-        help="Path to the input image file."
+        help="Path to the input image file(s)."
     )
+    parser.add_argument(
+        "--artifacts",
+        choices=MODES,
+        default=None,
+        help="Detection image writing: off, sync or background (default: ARTIFACTS_MODE)."
+    )
+    parser.add_argument(
+        "--format",
+        choices=("json",) + FORMATS,
+        default="json",
+        help="Print JSON, or append one row per detected instance to a columnar dataset in --out."
+    )
+    parser.add_argument("--out", type=str, default=None, help="Output directory for --format parquet/npz.")
+    parser.add_argument("--masks", action="store_true", help="Store each instance mask as RLE (columnar formats).")
     
     args = parser.parse_args()
+    if args.format != "json" and not args.out:
+        parser.error(f"--format {args.format} needs --out")
+    if args.masks and args.format == "json":
+        parser.error("--masks needs --format parquet or npz")
 
     print("Loading YOLO model...")
     try:
@@ -124,7 +122,31 @@ if __name__ == "__main__":
         sys.exit(1)
     print("Model loaded successfully.")
 
-    detection_results = run_detection(args.image, model)
-
-    print("\n--- Detection Results ---")
-    print(json.dumps(detection_results, indent=2))
\ No newline at end of file
+    artifacts = ArtifactWriter.from_settings(get_settings(), mode=args.artifacts)
+    writer = ColumnarWriter(args.out, args.format) if args.format != "json" else None
+    failed = 0
+    empty = 0
+    try:
+        for image_path in args.image:
+            try:
+                detection_results = run_detection(image_path, model, artifacts, return_masks=args.masks)
+            except Exception:
+                failed += 1
+                continue
+            if writer is not None and "error" in detection_results:
+                # nothing to put in the detections table; keep the reason in the results table
+                writer.write(image_path, detection_results)
+                empty += 1
+            elif writer is not None:
+                writer.write_detections(image_path, detection_results, detection_results.pop("masks", None))
+            else:
+                print("\n--- Detection Results ---")
+                print(json.dumps(detection_results, indent=2))
+    finally:
+        artifacts.close()
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        print(f"Wrote detections for {len(args.image) - failed - empty} images to {args.out} ({empty} without detections, {failed} failed)")
+    if failed:
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,180 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+
+from capacity_estimator.aio import ApiLimiter, limited_scale_fn
+from capacity_estimator.config import get_settings
+from capacity_estimator.image_io import decode
+from capacity_estimator.metrics import REGISTRY
+from capacity_estimator.pipeline import CapacityPipeline
+from capacity_estimator.registry import enable_warmup, get_registry
+from server.batching import MicroBatcher
+from server.food import find_main_food, summarize_detection
+from server.yolo.yolo import YOLOModel
+
+MAX_BATCH_SIZE = int(os.getenv("SERVER_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("SERVER_MAX_WAIT_MS", "10"))
+
+state = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models are loaded once per worker process and shared by all requests.
+    enable_warmup()
+    yolo_model = YOLOModel()
+    if yolo_model.model is None:
+        raise RuntimeError("Model initialization failed.")
+    pipeline = CapacityPipeline()
+    try:
+        # load and warm the segmentation checkpoint now rather than on the first request
+        pipeline.yolo.model
+    except Exception as e:
+        print(f"Segmentation model not loaded ({e}); capacity requests will use the contour fallback.")
+    state["yolo_model"] = yolo_model
+    state["pipeline"] = pipeline
+    state["detect"] = MicroBatcher(yolo_model.predict_batch, MAX_BATCH_SIZE, MAX_WAIT_MS)
+    state["segment"] = MicroBatcher(lambda frames: pipeline.yolo.extract_batch(frames, roi=True), MAX_BATCH_SIZE, MAX_WAIT_MS)
+    state["genai_client"] = None
+    settings = get_settings()
+    state["limiter"] = ApiLimiter.from_settings(settings)
+    state["scale_fn"] = limited_scale_fn(pipeline.gemini, asyncio.get_running_loop(), state["limiter"])
+    api_key = settings.gemini_api_key
+    if api_key:
+        from google import genai
+        state["genai_client"] = genai.Client(api_key=api_key)
+    await state["detect"].start()
+    await state["segment"].start()
+    yield
+    await state["detect"].stop()
+    await state["segment"].stop()
+    state["pipeline"].artifacts.close()
+    state.clear()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+async def read_upload(file: UploadFile):
+    data = await file.read()
+    bgr, decode_scale = await asyncio.to_thread(decode, data, state["pipeline"].decode_max_side)
+    if bgr is None:
+        raise HTTPException(status_code=400, detail="Could not decode image.")
+    return data, bgr, decode_scale
+
+
+async def detect_food(bgr):
+    detections, _ = await state["detect"].submit(bgr)
+    return summarize_detection(detections)
+
+
+async def estimate_capacity(data, bgr, decode_scale, filename, mm_per_px, aruco_mm, wall_mm, crop_margin, use_gemini):
+    try:
+        seg = await state["segment"].submit(bgr)
+    except Exception as e:
+        seg = e
+    return await asyncio.to_thread(
+        state["pipeline"].process_frame, bgr, filename, mm_per_px, aruco_mm, wall_mm, None, crop_margin, use_gemini, seg, data, None, decode_scale, None, state["scale_fn"]
+    )
+
+
+async def detect_food_and_density(bgr):
+    # the density lookup only needs the label, so it starts while the capacity branch is still running
+    from calc_mass import get_food_density_async
+
+    summary = await detect_food(bgr)
+    if "error" in summary:
+        return summary, None, None
+    food_name = find_main_food(summary)
+    density_g_ml = await get_food_density_async(food_name, state["genai_client"], limiter=state["limiter"])
+    return summary, food_name, density_g_ml
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "models_loaded": "pipeline" in state}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return REGISTRY.render_prometheus()
+
+
+@app.get("/models")
+async def models():
+    return get_registry().stats()
+
+
+@app.post("/api/food-percentage")
+async def food_percentage(file: UploadFile = File(...)):
+    _, bgr, _ = await read_upload(file)
+    summary = await detect_food(bgr)
+    if "error" in summary:
+        raise HTTPException(status_code=422, detail=summary["error"])
+    return summary
+
+
+@app.post("/api/capacity")
+async def capacity(
+    file: UploadFile = File(...),
+    mm_per_px: Optional[float] = None,
+    aruco_mm: Optional[float] = None,
+    wall_mm: float = 0.0,
+    crop_margin: int = 20,
+    use_gemini: bool = False,
+):
+    data, bgr, decode_scale = await read_upload(file)
+    try:
+        return await estimate_capacity(data, bgr, decode_scale, file.filename or "upload.jpg", mm_per_px, aruco_mm, wall_mm, crop_margin, use_gemini)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/api/mass")
+async def mass(
+    file: UploadFile = File(...),
+    mm_per_px: Optional[float] = None,
+    aruco_mm: Optional[float] = None,
+    wall_mm: float = 0.0,
+    crop_margin: int = 20,
+    use_gemini: bool = True,
+):
+    data, bgr, decode_scale = await read_upload(file)
+    food, volume = await asyncio.gather(
+        detect_food_and_density(bgr),
+        estimate_capacity(data, bgr, decode_scale, file.filename or "upload.jpg", mm_per_px, aruco_mm, wall_mm, crop_margin, use_gemini),
+        return_exceptions=True,
+    )
+    if isinstance(food, Exception):
+        raise HTTPException(status_code=422, detail=str(food))
+    summary, food_name, density_g_ml = food
+    if "error" in summary:
+        raise HTTPException(status_code=422, detail=summary["error"])
+    if isinstance(volume, Exception):
+        raise HTTPException(status_code=422, detail=str(volume))
+    if volume["units"]["volume"] != "mL":
+        raise HTTPException(status_code=422, detail=f"Could not resolve a metric scale ({volume['notes']}).")
+    food_fraction = summary["food_percentage"] / 100.0
+    food_volume_ml = volume["volume"] * food_fraction
+    return {
+        "food_name": food_name,
+        "food_percentage": summary["food_percentage"],
+        "total_volume_ml": volume["volume"],
+        "food_volume_ml": food_volume_ml,
+        "density_g_ml": density_g_ml,
+        "food_mass_g": food_volume_ml * density_g_ml,
+        "capacity": volume,
+    }
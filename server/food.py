@@ -0,0 +1,48 @@
+import numpy as np
+
+PLATE_CLASS = 58.0
+GARBAGE_CLASSES = {35.0}
+IGNORE_CLASSES = {58.0, 31.0, 42.0, 70.0, 83.0, 25.0, 27.0, 22.0, 11.0, 8.0}
+
+
+def summarize_detection(detections):
+    # Per-class area totals in a single bincount pass over class ids.
+    class_ids = detections.class_ids
+    minlength = int(max(IGNORE_CLASSES | GARBAGE_CLASSES)) + 1
+    per_class = np.bincount(class_ids, weights=detections.areas, minlength=minlength) if len(detections) else np.zeros(minlength)
+    is_food = np.ones(len(per_class), dtype=bool)
+    is_food[[int(c) for c in IGNORE_CLASSES | GARBAGE_CLASSES]] = False
+    plate_area = float(per_class[int(PLATE_CLASS)])
+    garbage_area = float(per_class[[int(c) for c in GARBAGE_CLASSES]].sum())
+    food_area = float(per_class[is_food].sum())
+
+    if plate_area == 0:
+        return {"error": "No plate detected in the image"}
+
+    if plate_area > garbage_area:
+        food_percentage = (food_area / (plate_area - garbage_area)) * 100
+    else:
+        food_percentage = 0
+
+    food_percentage = min(max(food_percentage, 0), 100)
+
+    return {
+        "food_percentage": round(food_percentage, 2),
+        "food_area": food_area,
+        "garbage_area": garbage_area,
+        "plate_area": plate_area,
+        "detected_objects_count": len(detections),
+        "objects": detections.to_dicts(),
+    }
+
+
+def find_main_food(detection):
+    main_food_name = None
+    max_food_area = 0
+    for obj in detection.get("objects", []):
+        label = obj.get("label")
+        if label not in IGNORE_CLASSES and label not in GARBAGE_CLASSES:
+            if obj.get("area", 0) > max_food_area:
+                max_food_area = obj["area"]
+                main_food_name = obj.get("label_name")
+    return main_food_name
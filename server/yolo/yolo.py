@@ -1,42 +1,134 @@
-from ultralytics import YOLO
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
 import torch
 
+from capacity_estimator.backends import backend_from_settings, load_yolo, model_key
+from capacity_estimator.config import get_settings
+from capacity_estimator.metrics import StageTimer
+from capacity_estimator.registry import get_registry, yolo_warmup
+
+WEIGHTS = "server/yolo/weights/yolov11-x-weights-v6.pt"
+
+
+@dataclass
+class Detections:
+    labels: np.ndarray
+    confidences: np.ndarray
+    boxes: np.ndarray
+    areas: np.ndarray
+    names: Dict[int, str]
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros(0), np.zeros(0), np.zeros((0, 4)), np.zeros(0), names or {})
+
+    @classmethod
+    def concat(cls, parts: List["Detections"]):
+        if not parts:
+            return cls.empty()
+        return cls(
+            np.concatenate([p.labels for p in parts]),
+            np.concatenate([p.confidences for p in parts]),
+            np.concatenate([p.boxes for p in parts]),
+            np.concatenate([p.areas for p in parts]),
+            parts[0].names,
+            {k: v for p in parts for k, v in p.timings.items()},
+        )
+
+    @property
+    def class_ids(self) -> np.ndarray:
+        return self.labels.astype(np.int64)
+
+    def to_dicts(self):
+        return [
+            {
+                "label": label,
+                "label_name": self.names[int(label)],
+                "confidence": conf,
+                "box": [box],
+                "area": area,
+            }
+            for label, conf, box, area in zip(self.labels.tolist(), self.confidences.tolist(), self.boxes.tolist(), self.areas.tolist())
+        ]
+
 
 class YOLOModel:
-    def __init__(self):
-        self.model = self.load_model()
+    def __init__(self, backend: str = None):
+        # backend: torch, onnx or openvino (default: YOLO_BACKEND); exports are built once and cached
+        self.backend = backend_from_settings(get_settings(), backend)
+        # exported graphs have a static input size; torch keeps ultralytics' default of 640
+        self.imgsz = self.backend["imgsz"] if self.backend["backend"] != "torch" else 640
+        self.model_id = model_key(WEIGHTS, self.backend)
+        self.load_model()
+
+    @property
+    def model(self):
+        # fetched from the shared model registry on each use, so eviction is not defeated by this instance
+        return self.load_model()
 
     def load_model(self):
+        registry = get_registry()
+        resident = self.model_id in registry
         try:
-            print("Loading YOLO model...")
-            model = YOLO("server/yolo/weights/yolov11-x-weights-v6.pt")
-            print("Model loaded!")
+            if not resident:
+                print(f"Loading YOLO model ({self.backend['backend']})...")
+            model = registry.get(self.model_id, lambda: load_yolo(WEIGHTS, **self.backend), yolo_warmup(self.imgsz))
+            if not resident:
+                print("Model loaded!")
             return model
         except Exception as e:
             print(f"Error loading model: {e}")
             return None
 
-    def predict(self, frame):
+    def _columns(self, result) -> Detections:
+        names = result.names if isinstance(result.names, dict) else dict(enumerate(result.names))
+        if result.masks is None or len(result.boxes) == 0:
+            return Detections.empty(names)
+        boxes = result.boxes
+        areas = result.masks.data.sum(dim=(1, 2))
+        # One device-to-host transfer for every column.
+        cols = torch.cat([boxes.cls[:, None], boxes.conf[:, None], boxes.xyxy, areas[:, None].to(boxes.cls.dtype)], dim=1).cpu().numpy()
+        return Detections(cols[:, 0], cols[:, 1], cols[:, 2:6], cols[:, 6], names)
+
+    def predict_arrays(self, frame):
         try:
             print("Predicting...")
-            with torch.no_grad():
-                results = self.model(frame)
-            detected_objects = []
-            for result in results:
-                for i, (mask, box) in enumerate(zip(result.masks.data, result.boxes)):
-                    area = mask.sum().item()
-                    detected_objects.append(
-                        {
-                            "label": box.cls.item(),
-                            "label_name": result.names[box.cls.item()],
-                            "confidence": box.conf.item(),
-                            "box": box.xyxy.tolist(),
-                            "area": area,
-                        }
-                    )
-
+            timer = StageTimer()
+            with timer.stage("yolo_inference"), torch.no_grad():
+                results = self.model(frame, imgsz=self.imgsz)
+            with timer.stage("yolo_postprocess"):
+                detections = Detections.concat([self._columns(result) for result in results])
+            detections.timings = dict(timer.timings)
             print("Success!")
-            return detected_objects, results
+            return detections, results
         except Exception as e:
             print(f"Error predicting: {e}")
             return None, None
+
+    def predict(self, frame):
+        detections, results = self.predict_arrays(frame)
+        if detections is None:
+            return None, None
+        return detections.to_dicts(), results
+
+    def predict_batch(self, frames):
+        # One forward pass over a list of frames; returns [(Detections, result), ...] in input order.
+        timer = StageTimer()
+        with timer.stage("yolo_inference"), torch.no_grad():
+            results = self.model(list(frames), imgsz=self.imgsz, verbose=False)
+        out = []
+        for result in results:
+            t0 = time.perf_counter()
+            detections = self._columns(result)
+            timer.record("yolo_postprocess", t0, time.perf_counter())
+            # the batched forward pass is attributed to its frames in equal shares
+            detections.timings = {"yolo_inference": timer.timings["yolo_inference"] / len(results), "yolo_postprocess": (time.perf_counter() - t0) * 1000.0}
+            out.append((detections, result))
+        return out
@@ -0,0 +1,80 @@
+import asyncio, random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+from .metrics import REGISTRY
+class ApiLimiter:
+    # Global limiter for blocking API calls made from asyncio code: at most `concurrency` calls in flight,
+    # a per-attempt timeout (covering the wait for a permit) and exponential backoff with jitter between
+    # attempts. Calls run on the limiter's own pool, never on the loop's default executor: callers are often
+    # pipeline stages already occupying default-executor threads. A timed-out call keeps its permit (and its
+    # pool thread) until it actually returns, so abandoned requests still count against the limit.
+    def __init__(self, concurrency:int=4, timeout:Union[float,None]=30.0, retries:int=2, backoff:float=0.5, max_backoff:float=8.0):
+        self.concurrency=concurrency
+        self.timeout=timeout
+        self.retries=retries
+        self.backoff=backoff
+        self.max_backoff=max_backoff
+        self._sem=None
+        self._pool=ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="api")
+    @classmethod
+    def from_settings(cls, s):
+        return cls(concurrency=s.api_concurrency, timeout=s.api_timeout_s, retries=s.api_retries, backoff=s.api_backoff_s)
+    @property
+    def sem(self):
+        # created lazily so the semaphore binds to the running loop
+        if self._sem is None:
+            self._sem=asyncio.Semaphore(self.concurrency)
+        return self._sem
+    async def _run(self, fn, args, kwargs):
+        await self.sem.acquire()
+        try:
+            fut=asyncio.get_running_loop().run_in_executor(self._pool, lambda: fn(*args, **kwargs))
+        except BaseException:
+            self.sem.release()
+            raise
+        fut.add_done_callback(lambda _: self.sem.release())
+        return await asyncio.shield(fut)
+    async def _attempt(self, fn, args, kwargs, timeout):
+        return await asyncio.wait_for(self._run(fn, args, kwargs), timeout)
+    async def call(self, fn, *args, name:str="api", retry_if=None, timeout:Union[float,None]=None, **kwargs):
+        # fn(*args, **kwargs) in a worker thread; retries on exceptions/timeouts and when retry_if(result) is true.
+        # The last result is returned (or the last exception raised) once the attempts are used up.
+        timeout=self.timeout if timeout is None else timeout
+        for attempt in range(self.retries+1):
+            last=attempt==self.retries
+            try:
+                res=await self._attempt(fn, args, kwargs, timeout)
+                if last or retry_if is None or not retry_if(res):
+                    return res
+                REGISTRY.inc(f"{name}_retries")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                REGISTRY.inc(f"{name}_timeouts" if isinstance(e, asyncio.TimeoutError) else f"{name}_errors")
+                if last:
+                    raise
+            delay=min(self.max_backoff, self.backoff*2**attempt)
+            await asyncio.sleep(delay*random.uniform(0.5,1.0))
+    def close(self):
+        self._pool.shutdown(wait=False)
+    def call_from_thread(self, loop, fn, *args, **kwargs):
+        # blocking entry point for code already running in a worker thread of `loop` (e.g. the pipeline stages)
+        return asyncio.run_coroutine_threadsafe(self.call(fn, *args, **kwargs), loop).result()
+_limiter=None
+def get_limiter() -> ApiLimiter:
+    # process-wide limiter from Settings, shared by every caller of the Gemini API
+    global _limiter
+    if _limiter is None:
+        from .config import get_settings
+        _limiter=ApiLimiter.from_settings(get_settings())
+    return _limiter
+def limited_scale_fn(estimator, loop, limiter:Union[ApiLimiter,None]=None):
+    # drop-in for estimator.estimate_mm_per_px (CapacityPipeline.process_frame's scale_fn) that runs the request
+    # through the limiter; error results are retried unless the key is missing, failures come back as {"error":...}
+    limiter=limiter or get_limiter()
+    def fn(image_path, meta, data=None, timer=None):
+        try:
+            return limiter.call_from_thread(loop, estimator.estimate_mm_per_px, image_path, meta, data=data, timer=timer, name="gemini_scale", retry_if=lambda r: isinstance(r,dict) and "error" in r and bool(estimator.api_key))
+        except Exception as e:
+            return {"error":str(e) or type(e).__name__}
+    return fn
@@ -0,0 +1,70 @@
+import os, sys, random, threading, cv2
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import REGISTRY
+MODES=("off","sync","background")
+def downscale(img, max_side):
+    # (image, scale) with the long side capped at max_side
+    h,w=img.shape[:2]
+    if not max_side or max(h,w)<=max_side:
+        return img, 1.0
+    s=max_side/max(h,w)
+    return cv2.resize(img,(max(1,round(w*s)),max(1,round(h*s))),interpolation=cv2.INTER_AREA), s
+class ArtifactWriter:
+    # Writes debug/preview images: off, inline (sync), or on a bounded thread pool that blocks
+    # producers once max_pending encodes are queued (background). Callers check sample() once per
+    # request; submit() renders lazily so skipped artifacts cost nothing.
+    def __init__(self, mode="sync", workers=2, max_pending=16, preview_max_side=None, fast=False, sample_rate=1.0):
+        if mode not in MODES:
+            raise ValueError(f"artifact mode must be one of {MODES}")
+        self.mode=mode
+        self.preview_max_side=preview_max_side
+        self.fast=fast
+        self.sample_rate=sample_rate
+        self._slots=threading.BoundedSemaphore(max_pending)
+        self._pool=ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artifacts") if mode=="background" else None
+        self._errors=[]
+    @classmethod
+    def from_settings(cls, s, mode=None):
+        return cls(mode=mode or s.artifacts_mode, workers=s.artifacts_workers, max_pending=s.artifacts_max_pending, preview_max_side=s.artifacts_preview_max_side, fast=s.artifacts_fast, sample_rate=s.artifacts_sample_rate)
+    def sample(self):
+        # per-request decision whether this request's artifacts are written at all
+        return self.mode!="off" and (self.sample_rate>=1.0 or random.random()<self.sample_rate)
+    def encode_params(self, path):
+        ext=os.path.splitext(path)[1].lower()
+        if ext==".png":
+            return [cv2.IMWRITE_PNG_COMPRESSION, 1 if self.fast else 3]
+        if ext in (".jpg",".jpeg"):
+            return [cv2.IMWRITE_JPEG_QUALITY, 80 if self.fast else 95]
+        return []
+    def _write(self, path, render):
+        # failures are counted (artifact_write_errors) and reported by close(); they never fail the request
+        try:
+            img=render()
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not cv2.imwrite(path, img, self.encode_params(path)):
+                raise RuntimeError("cv2.imwrite failed")
+            return True
+        except Exception as e:
+            self._errors.append((path, e))
+            REGISTRY.inc("artifact_write_errors")
+            return False
+    def submit(self, path, render):
+        # render() -> BGR image; returns the path it will be written to, or None when off or (sync) the write failed
+        if self.mode=="off":
+            return None
+        if self._pool is None:
+            return path if self._write(path, render) else None
+        self._slots.acquire()
+        fut=self._pool.submit(self._write, path, render)
+        fut.add_done_callback(lambda _: self._slots.release())
+        return path
+    def close(self):
+        # waits for pending writes; reports and returns the [(path, exception)] failures since the last close
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool=None
+        errors,self._errors=self._errors,[]
+        for path,e in errors:
+            print(f"Failed to write artifact {path}: {str(e).strip()}", file=sys.stderr)
+        return errors
@@ -0,0 +1,93 @@
+import os, glob, hashlib, shutil, threading, cv2, numpy as np
+from typing import Union
+from .image_io import IMAGE_EXTS
+BACKENDS=("torch","onnx","openvino")
+_export_lock=threading.RLock()
+def _weights_digest(weights):
+    st=os.stat(weights)
+    return hashlib.sha256(f"{os.path.abspath(weights)}|{st.st_size}|{int(st.st_mtime)}".encode()).hexdigest()[:12]
+def export_path(weights, backend, imgsz, int8, export_dir):
+    stem=os.path.splitext(os.path.basename(weights))[0]
+    tag=f"{stem}-{_weights_digest(weights)}-{imgsz}{'-int8' if int8 else ''}"
+    return os.path.join(export_dir, f"{tag}.onnx" if backend=="onnx" else f"{tag}_openvino_model")
+def calibration_images(calib_dir, limit=200):
+    paths=sorted(p for p in glob.glob(os.path.join(calib_dir,"**","*"), recursive=True) if p.lower().endswith(IMAGE_EXTS))
+    if not paths:
+        raise FileNotFoundError(f"no calibration images in {calib_dir}")
+    return paths[:limit]
+def letterbox(bgr, imgsz):
+    # same geometry as ultralytics' LetterBox(auto=False): scale to fit, pad with 114, centred
+    h,w=bgr.shape[:2]
+    r=min(imgsz/h, imgsz/w)
+    nw,nh=round(w*r),round(h*r)
+    img=cv2.resize(bgr,(nw,nh),interpolation=cv2.INTER_LINEAR) if (nw,nh)!=(w,h) else bgr
+    top,left=(imgsz-nh)//2,(imgsz-nw)//2
+    return cv2.copyMakeBorder(img, top, imgsz-nh-top, left, imgsz-nw-left, cv2.BORDER_CONSTANT, value=(114,114,114))
+def _quantize_onnx(fp32_path, out_path, calib_dir, imgsz):
+    # static QDQ post-training quantization with onnxruntime; activations calibrated on calib_dir
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime as ort
+    input_name=ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.paths=iter(calibration_images(calib_dir))
+        def get_next(self):
+            for p in self.paths:
+                bgr=cv2.imread(p, cv2.IMREAD_COLOR)
+                if bgr is None:
+                    continue
+                x=letterbox(bgr, imgsz)[...,::-1].transpose(2,0,1)[None].astype(np.float32)/255.0
+                return {input_name:np.ascontiguousarray(x)}
+            return None
+    quantize_static(fp32_path, out_path, Reader(), quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+def _calibration_yaml(calib_dir, names, out_dir):
+    # ultralytics' OpenVINO INT8 export calibrates on a dataset yaml; labels are not needed for that
+    p=os.path.join(out_dir, "calibration.yaml")
+    with open(p,"w") as f:
+        f.write(f"path: {os.path.abspath(calib_dir)}\ntrain: .\nval: .\nnames:\n")
+        for i,n in sorted(names.items()):
+            f.write(f"  {i}: {n}\n")
+    return p
+def export_model(weights, backend, imgsz=640, int8=False, calib_dir=None, export_dir=None):
+    # Exports weights to ONNX/OpenVINO once and caches the artifact under export_dir (default: next to the weights).
+    if backend not in BACKENDS[1:]:
+        raise ValueError(f"backend must be one of {BACKENDS[1:]}")
+    if int8 and not calib_dir:
+        raise ValueError("INT8 export needs a calibration image directory (YOLO_CALIB_DIR)")
+    if not os.path.exists(weights):
+        # hub names like "yolov8n-seg.pt" are downloaded by ultralytics first
+        from ultralytics import YOLO
+        weights=YOLO(weights).ckpt_path or weights
+    export_dir=export_dir or os.path.dirname(os.path.abspath(weights))
+    out=export_path(weights, backend, imgsz, int8, export_dir)
+    with _export_lock:
+        if os.path.exists(out):
+            return out
+        from ultralytics import YOLO
+        os.makedirs(export_dir, exist_ok=True)
+        if backend=="onnx" and int8:
+            _quantize_onnx(export_model(weights, "onnx", imgsz, False, None, export_dir), out+".tmp", calib_dir, imgsz)
+            os.replace(out+".tmp", out)
+            return out
+        model=YOLO(weights)
+        if backend=="onnx":
+            exported=model.export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True, verbose=False)
+        else:
+            data=_calibration_yaml(calib_dir, model.names, export_dir) if int8 else None
+            exported=model.export(format="openvino", imgsz=imgsz, int8=int8, data=data, dynamic=False, verbose=False)
+        shutil.move(str(exported).rstrip(os.sep), out)
+        return out
+def load_yolo(weights, backend="torch", imgsz=640, int8=False, calib_dir=None, export_dir=None, task="segment"):
+    # An ultralytics YOLO object for any backend; exported models return the same Results (masks, boxes, names).
+    from ultralytics import YOLO
+    if backend=="torch":
+        return YOLO(weights)
+    return YOLO(export_model(weights, backend, imgsz, int8, calib_dir, export_dir), task=task)
+def model_key(weights, opts=None):
+    # cache key for weights loaded with load_yolo(**opts); exported models can differ slightly from torch
+    if not opts or opts.get("backend","torch")=="torch":
+        return weights
+    return f"{weights}:{opts['backend']}{'-int8' if opts.get('int8') else ''}@{opts.get('imgsz',640)}"
+def backend_from_settings(s, backend:Union[str,None]=None):
+    # kwargs for load_yolo from Settings; backend overrides YOLO_BACKEND
+    return {"backend":backend or s.yolo_backend, "imgsz":s.yolo_export_imgsz, "int8":s.yolo_int8, "calib_dir":s.yolo_calib_dir, "export_dir":s.yolo_export_dir}
@@ -0,0 +1,83 @@
+import os, io, hashlib, threading, cv2, numpy as np
+CACHE_VERSION="seg-v1"
+class StageCache:
+    # On-disk memo of segmentation + rotation per (image content, model settings); LRU by file mtime under a byte cap.
+    # A running byte total (from one directory scan, then updated per put) decides when to evict, so only puts
+    # that cross the cap pay for the walk; the walk also corrects drift from other processes sharing the dir.
+    def __init__(self, cache_dir:str, max_bytes:int=512*1024*1024):
+        self.cache_dir=cache_dir
+        self.max_bytes=max_bytes
+        self._lock=threading.Lock()
+        self._total=None
+        os.makedirs(cache_dir, exist_ok=True)
+    @staticmethod
+    def key(image_bytes:bytes, model_name:str, conf:float, imgsz, decode_scale:float=1.0):
+        h=hashlib.sha256(image_bytes).hexdigest()
+        # entries hold frame coordinates, so reduced decodes get their own keys
+        suffix=f"|{decode_scale:.6f}" if decode_scale!=1.0 else ""
+        return hashlib.sha256(f"{CACHE_VERSION}|{h}|{model_name}|{conf}|{imgsz}{suffix}".encode()).hexdigest()
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key+".npz")
+    def get(self, key):
+        p=self._path(key)
+        try:
+            with np.load(p) as z:
+                mask=cv2.imdecode(z["mask_png"], cv2.IMREAD_GRAYSCALE)
+                out=((mask>0).astype(np.uint8), tuple(int(v) for v in z["offset"]), z["cnt"].astype(np.int32), float(z["rot"]))
+            os.utime(p)
+            return out
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+    def put(self, key, mask_roi, offset, cnt, rot):
+        ok,png=cv2.imencode(".png", (mask_roi>0).astype(np.uint8)*255, [cv2.IMWRITE_PNG_BILEVEL, 1])
+        if not ok:
+            return
+        buf=io.BytesIO()
+        np.savez_compressed(buf, mask_png=png.reshape(-1), offset=np.asarray(offset,np.int64), cnt=np.asarray(cnt,np.int32), rot=np.float64(rot))
+        p=self._path(key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp=p+f".{os.getpid()}.{threading.get_ident()}.tmp"
+        data=buf.getvalue()
+        try:
+            old=os.path.getsize(p)
+        except OSError:
+            old=0
+        with open(tmp,"wb") as f:
+            f.write(data)
+        os.replace(tmp,p)
+        with self._lock:
+            if self._total is None:
+                self._total=self._scan()[1]
+            else:
+                self._total+=len(data)-old
+            over=self._total>self.max_bytes
+        if over:
+            self.evict()
+    def _scan(self):
+        entries=[]
+        for root,_,files in os.walk(self.cache_dir):
+            for fn in files:
+                if fn.endswith(".npz"):
+                    fp=os.path.join(root,fn)
+                    try:
+                        st=os.stat(fp)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, fp))
+        return entries, sum(e[1] for e in entries)
+    def evict(self, low_water:float=0.9):
+        # drops the oldest entries down to low_water*max_bytes, so the next walk is many puts away
+        with self._lock:
+            entries,total=self._scan()
+            if total<=self.max_bytes:
+                self._total=total
+                return
+            for _,size,fp in sorted(entries):
+                if total<=self.max_bytes*low_water:
+                    break
+                try:
+                    os.remove(fp)
+                except FileNotFoundError:
+                    pass
+                total-=size
+            self._total=total
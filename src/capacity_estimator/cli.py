@@ -1,23 +1,156 @@
-import argparse, os, json
-from .pipeline import CapacityPipeline
+import argparse, os, sys, json, glob
+from .pipeline import CapacityPipeline, INTEGRATORS
+from .metrics import REGISTRY, StageTimer
+from .artifacts import ArtifactWriter, MODES
+from .config import get_settings
+from .backends import BACKENDS
+from .parallel import ParallelRunner
+from .columnar import ColumnarWriter, FORMATS
+from .video import VideoCapacityRunner, iter_frames
+from .image_io import IMAGE_EXTS
+def collect_images(args):
+    paths=list(args.images or [])
+    if args.input_dir:
+        pattern=args.glob or "*"
+        paths+=sorted(p for p in glob.glob(os.path.join(args.input_dir, pattern), recursive=True) if p.lower().endswith(IMAGE_EXTS))
+    elif args.glob:
+        paths+=sorted(p for p in glob.glob(args.glob, recursive=True) if p.lower().endswith(IMAGE_EXTS))
+    return paths
+def pipeline_kwargs(args):
+    return {"yolo_model":args.yolo_model, "yolo_conf":args.yolo_conf, "yolo_imgsz":args.yolo_imgsz, "outlines_dir":args.outlines_dir, "gemini_model":args.gemini_model, "stage_cache_dir":args.stage_cache, "decode_max_side":args.decode_max_side, "yolo_backend":args.yolo_backend, "integrator":args.integrator, "integration_slices":args.slices}
+class JsonlWriter:
+    def __init__(self, path):
+        self.out=open(path,"w") if path and path!="-" else sys.stdout
+    def write(self, image, res):
+        self.out.write(json.dumps({"image":image, **res} if image is not None else res)+"\n")
+        self.out.flush()
+    def close(self):
+        if self.out is not sys.stdout:
+            self.out.close()
+def open_writer(args):
+    # --format jsonl streams to --jsonl; parquet/npz append to the columnar dataset in --out
+    if args.format=="jsonl":
+        return JsonlWriter(args.jsonl)
+    return ColumnarWriter(args.out, args.format, chunk_rows=args.chunk_rows)
+def run_batch(pipe, args, paths):
+    out=open_writer(args)
+    n_ok=0
+    runner=None
+    if args.workers>1:
+        runner=ParallelRunner(workers=args.workers, threads_per_worker=args.threads_per_worker, factory_kwargs={"artifacts_mode":args.artifacts, **pipeline_kwargs(args)})
+        results=runner.map_paths(paths, ordered=not args.unordered, return_masks=args.masks, mm_per_px=args.mm_per_px, aruco_mm=args.aruco_mm, wall_mm=args.wall_mm, debug_dir=args.debug, crop_margin=args.crop_margin, use_gemini=args.use_gemini, multi=args.multi)
+    else:
+        results=pipe.process_batch(paths, args.mm_per_px, args.aruco_mm, args.wall_mm, args.debug, args.crop_margin, args.use_gemini, batch_size=args.batch_size, return_masks=args.masks, multi=args.multi)
+    try:
+        for p,res in results:
+            n_ok+="error" not in res
+            out.write(p, res)
+    finally:
+        if runner is not None:
+            runner.close()
+        out.close()
+    print(f"Processed {len(paths)} images ({n_ok} ok, {len(paths)-n_ok} failed)", file=sys.stderr)
+def run_video(pipe, args):
+    out=open_writer(args)
+    runner=VideoCapacityRunner(pipe, keyframe_interval=args.keyframe_interval, scene_threshold=args.scene_threshold, iou_threshold=args.iou_threshold, smoothing=args.smoothing)
+    n=n_key=n_err=0
+    try:
+        for row in runner.run(iter_frames(args.video, args.frame_stride), args.mm_per_px, args.aruco_mm, args.wall_mm, args.crop_margin, write_outlines=pipe.artifacts.mode!="off"):
+            n+=1; n_key+=row["keyframe"]; n_err+="error" in row
+            out.write(None if args.format=="jsonl" else row["name"], row)
+    finally:
+        out.close()
+    print(f"Processed {n} frames ({n_key} keyframes, {n_err} failed)", file=sys.stderr)
+def write_metrics(args):
+    if args.metrics_out:
+        with open(args.metrics_out,"w") as f:
+            f.write(REGISTRY.render_prometheus())
 def main():
     ap=argparse.ArgumentParser(description="Gemini scale -> YOLO mask -> single-view capacity")
-    ap.add_argument("--image", required=True)
+    src=ap.add_argument_group("input (one of)")
+    one=src.add_mutually_exclusive_group()
+    one.add_argument("--image", default=None)
+    one.add_argument("--images", nargs="+", default=None, help="may be combined with --input-dir/--glob")
+    one.add_argument("--video", type=str, default=None, help="video file, camera index/stream URL, or a directory/glob of frames")
+    src.add_argument("--input-dir", type=str, default=None)
+    src.add_argument("--glob", type=str, default=None, help="glob pattern; relative to --input-dir when given, supports **")
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=1, help="worker processes for batch inputs (1 = in-process batching)")
+    ap.add_argument("--threads-per-worker", type=int, default=None, help="torch/OpenCV threads per worker (default: cores / workers)")
+    ap.add_argument("--unordered", action="store_true", help="with --workers, write results as they complete instead of in input order")
+    ap.add_argument("--jsonl", type=str, default="-", help="batch output path ('-' for stdout)")
+    ap.add_argument("--format", choices=("jsonl",)+FORMATS, default="jsonl", help="batch/video output: JSON lines, or a columnar dataset in --out (parquet needs pyarrow)")
+    ap.add_argument("--out", type=str, default=None, help="output directory for --format parquet/npz")
+    ap.add_argument("--chunk-rows", type=int, default=4096, help="rows per parquet row group / npz chunk")
+    ap.add_argument("--masks", action="store_true", help="store the selected mask of each image as RLE (columnar formats)")
+    ap.add_argument("--keyframe-interval", type=int, default=30, help="video: re-segment at least every N frames")
+    ap.add_argument("--scene-threshold", type=float, default=12.0, help="video: mean abs thumbnail difference that forces a keyframe")
+    ap.add_argument("--iou-threshold", type=float, default=0.6, help="video: keyframe mask IoU below this resets smoothing")
+    ap.add_argument("--smoothing", type=float, default=0.3, help="video: EMA weight of the newest keyframe volume (1 = none)")
+    ap.add_argument("--frame-stride", type=int, default=1, help="video: process every Nth frame")
     ap.add_argument("--mm-per-px", type=float, default=None)
     ap.add_argument("--aruco-mm", type=float, default=None)
     ap.add_argument("--wall-mm", type=float, default=0.0)
     ap.add_argument("--debug", type=str, default=None)
     ap.add_argument("--crop-margin", type=int, default=20)
+    ap.add_argument("--integrator", choices=INTEGRATORS, default=None, help="raster mask rows or sub-pixel contour slices (default: INTEGRATOR)")
+    ap.add_argument("--slices", type=int, default=None, help="contour integrator slice count (default: INTEGRATION_SLICES)")
+    ap.add_argument("--multi", action="store_true", help="measure every container instance (CONTAINER_CLASSES) from one inference")
     ap.add_argument("--use-gemini", action="store_true")
     ap.add_argument("--gemini-model", type=str, default=None)
     ap.add_argument("--outlines-dir", type=str, default=None)
     ap.add_argument("--yolo-model", type=str, default=None)
     ap.add_argument("--yolo-conf", type=float, default=None)
     ap.add_argument("--yolo-imgsz", type=int, default=None)
+    ap.add_argument("--yolo-backend", choices=BACKENDS, default=None, help="inference backend (default: YOLO_BACKEND); onnx/openvino exports are cached")
+    ap.add_argument("--artifacts", choices=MODES, default=None, help="outline image writing: off, sync or background (default: ARTIFACTS_MODE)")
+    ap.add_argument("--trace", type=str, default=None, help="write a Chrome trace JSON of the stages (single --image runs)")
+    ap.add_argument("--metrics-out", type=str, default=None, help="write Prometheus-format stage metrics at exit")
+    ap.add_argument("--decode-max-side", type=int, default=None, help="decode JPEGs at 1/2, 1/4 or 1/8 while the long side stays >= this (default: DECODE_MAX_SIDE)")
+    ap.add_argument("--stage-cache", type=str, default=None, help="directory for memoized segmentation/rotation results")
     args=ap.parse_args()
-    pipe=CapacityPipeline(yolo_model=args.yolo_model, yolo_conf=args.yolo_conf, yolo_imgsz=args.yolo_imgsz, outlines_dir=args.outlines_dir, gemini_model=args.gemini_model)
-    res=pipe.process(args.image, args.mm_per_px, args.aruco_mm, args.wall_mm, args.debug, args.crop_margin, args.use_gemini)
+    if not (args.image or args.images or args.input_dir or args.glob or args.video):
+        ap.error("one of --image, --images, --input-dir, --glob or --video is required")
+    if (args.image or args.video) and (args.input_dir or args.glob):
+        ap.error("--input-dir/--glob cannot be combined with --image or --video")
+    if args.format!="jsonl" and not args.out:
+        ap.error(f"--format {args.format} needs --out")
+    if args.masks and args.format=="jsonl":
+        ap.error("--masks needs --format parquet or npz")
+    if args.multi and (args.video or args.masks):
+        ap.error("--multi does not support --video or --masks")
+    artifacts=ArtifactWriter.from_settings(get_settings(), mode=args.artifacts)
+    pipe=CapacityPipeline(artifacts=artifacts, **pipeline_kwargs(args))
+    if args.video:
+        try:
+            run_video(pipe, args)
+        finally:
+            artifacts.close()
+        write_metrics(args)
+        return
+    if not args.image:
+        paths=collect_images(args)
+        if not paths:
+            ap.error("no input images found")
+        try:
+            run_batch(pipe, args, paths)
+        finally:
+            artifacts.close()
+        write_metrics(args)
+        return
+    timer=StageTimer()
+    res=pipe.process(args.image, args.mm_per_px, args.aruco_mm, args.wall_mm, args.debug, args.crop_margin, args.use_gemini, timer=timer, multi=args.multi)
+    artifacts.close()
+    if args.trace:
+        timer.save_chrome_trace(args.trace)
+    write_metrics(args)
     vu=res["units"]["volume"]; hu=res["units"]["height"]
+    for inst in res.get("instances") or []:
+        what=f"#{inst['index']} {inst['label'] or 'object'}"
+        if "error" in inst:
+            print(f"{what}: {inst['error']}")
+        else:
+            print(f"{what}: {inst['volume']:.2f} {vu}, {inst['height']:.1f} {hu}, rotated {inst['rotation_applied_deg']:.1f} deg")
     if vu=="px^3":
         print(f"Estimated volume: {res['volume']:.0f} {vu}")
         print(f"Estimated height: {res['height']:.1f} {hu}")
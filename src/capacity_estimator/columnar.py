@@ -0,0 +1,195 @@
+import os, re, glob, json, uuid, itertools, numpy as np
+from typing import Union
+FORMATS=("parquet","npz")
+# (column, kind); kinds: str, f8 (NaN = missing), i4 (-1 = missing), rle (uint32 run lengths or nothing)
+RESULT_COLUMNS=[("image","str"),("error","str"),("volume","f8"),("height","f8"),("volume_unit","str"),("height_unit","str"),
+    ("notes","str"),("rotation_applied_deg","f8"),("crop_y1","i4"),("crop_y2","i4"),("crop_x1","i4"),("crop_x2","i4"),
+    ("scale_mm_per_px","f8"),("scale_uncertainty_mm_per_px","f8"),("outline_path","str"),("timings","str"),("gemini","str"),("extra","str"),
+    ("mask_h","i4"),("mask_w","i4"),("mask_x0","i4"),("mask_y0","i4"),("mask_scale","f8"),("mask_rle","rle")]
+DETECTION_COLUMNS=[("image","str"),("instance","i4"),("label","i4"),("label_name","str"),("confidence","f8"),("area","f8"),
+    ("box_x0","f8"),("box_y0","f8"),("box_x1","f8"),("box_y1","f8"),("mask_h","i4"),("mask_w","i4"),("mask_x0","i4"),("mask_y0","i4"),("mask_rle","rle")]
+TABLES={"results":RESULT_COLUMNS, "detections":DETECTION_COLUMNS}
+_RESULT_KEYS={"image","error","volume","height","units","notes","rotation_applied_deg","crop","scale_mm_per_px","scale_uncertainty_mm_per_px","outline_path","timings","gemini","mask"}
+def rle_encode(mask):
+    # row-major run lengths of a 0/1 mask, starting with a (possibly empty) background run
+    flat=np.asarray(mask).ravel()!=0
+    if flat.size==0:
+        return np.zeros(0,np.uint32)
+    edges=np.flatnonzero(flat[1:]!=flat[:-1])+1
+    counts=np.diff(np.concatenate(([0],edges,[flat.size])))
+    if flat[0]:
+        counts=np.concatenate(([0],counts))
+    return counts.astype(np.uint32)
+def rle_decode(counts, shape):
+    counts=np.asarray(counts, np.int64)
+    return np.repeat((np.arange(counts.size)&1).astype(np.uint8), counts).reshape(shape)
+def _mask_cols(mask):
+    # mask: {"roi", "offset", optional "decode_scale"} as produced with return_masks
+    if not mask or mask.get("roi") is None:
+        return {}
+    roi=mask["roi"]
+    return {"mask_h":roi.shape[0], "mask_w":roi.shape[1], "mask_x0":mask["offset"][0], "mask_y0":mask["offset"][1], "mask_scale":mask.get("decode_scale",1.0), "mask_rle":rle_encode(roi)}
+def result_row(image, res):
+    # flattens a Result dict (or an {"error":...} dict, or a video row) into RESULT_COLUMNS
+    crop=res.get("crop") or [None]*4
+    units=res.get("units") or {}
+    extra={k:v for k,v in res.items() if k not in _RESULT_KEYS}
+    row={"image":image, "error":res.get("error"), "volume":res.get("volume"), "height":res.get("height"), "volume_unit":units.get("volume"), "height_unit":units.get("height"),
+         "notes":res.get("notes"), "rotation_applied_deg":res.get("rotation_applied_deg"), "crop_y1":crop[0], "crop_y2":crop[1], "crop_x1":crop[2], "crop_x2":crop[3],
+         "scale_mm_per_px":res.get("scale_mm_per_px"), "scale_uncertainty_mm_per_px":res.get("scale_uncertainty_mm_per_px"), "outline_path":res.get("outline_path"),
+         "timings":json.dumps(res["timings"]) if res.get("timings") else None, "gemini":json.dumps(res["gemini"], default=str) if res.get("gemini") else None,
+         "extra":json.dumps(extra, default=str) if extra else None}
+    row.update(_mask_cols(res.get("mask")))
+    return row
+def detection_rows(image, summary, masks=None):
+    # one row per detected instance of a summarize_detection() dict; masks: [(roi, (x0,y0)), ...] in the same order
+    rows=[]
+    for i,obj in enumerate(summary.get("objects", [])):
+        box=np.asarray(obj.get("box"), float).ravel()
+        row={"image":image, "instance":i, "label":int(obj["label"]), "label_name":obj.get("label_name"), "confidence":obj.get("confidence"), "area":obj.get("area"),
+             "box_x0":box[0], "box_y0":box[1], "box_x1":box[2], "box_y1":box[3]}
+        if masks is not None and i<len(masks) and masks[i] is not None:
+            row.update(_mask_cols({"roi":masks[i][0], "offset":masks[i][1]}))
+        rows.append(row)
+    return rows
+def _column(kind, values):
+    if kind=="str":
+        return np.array(["" if v is None else str(v) for v in values])
+    if kind=="f8":
+        return np.array([np.nan if v is None else v for v in values], np.float64)
+    if kind=="i4":
+        return np.array([-1 if v is None else v for v in values], np.int32)
+    lens=np.array([0 if v is None else len(v) for v in values], np.int64)
+    data=np.concatenate([v for v in values if v is not None]) if lens.any() else np.zeros(0,np.uint32)
+    return data.astype(np.uint32), np.concatenate(([0],np.cumsum(lens)))
+def _next_part(table_dir):
+    # one past the highest part number present (either format), 0 for a new dataset
+    nums=[int(m.group(1)) for f in (os.listdir(table_dir) if os.path.isdir(table_dir) else ()) for m in [re.match(r"part-(\d+)", f)] if m]
+    return max(nums)+1 if nums else 0
+class ColumnarWriter:
+    # Appends rows to one dataset per table under out_dir as <table>/part-NNNNN-<writer>.parquet (needs pyarrow)
+    # or .npz chunks, one file per chunk. Strings are stored as text, missing floats as NaN, missing
+    # ints as -1; RLE masks as one flat uint32 array per chunk plus row offsets. Use as a context manager.
+    def __init__(self, out_dir:str, fmt:str="parquet", chunk_rows:int=4096):
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {FORMATS}")
+        if fmt=="parquet":
+            try:
+                import pyarrow
+            except ImportError:
+                raise RuntimeError("parquet output needs pyarrow (pip install pyarrow); use npz otherwise")
+        self.out_dir=out_dir
+        self.fmt=fmt
+        self.chunk_rows=chunk_rows
+        self._rows={t:[] for t in TABLES}
+        # chunks continue after the highest existing part, so repeated runs append; the per-writer token keeps
+        # concurrent writers on the same dataset from picking the same name
+        self._parts={t:_next_part(os.path.join(out_dir, t)) for t in TABLES}
+        self._token=uuid.uuid4().hex[:8]
+        os.makedirs(out_dir, exist_ok=True)
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
+    def write(self, image, res):
+        self._append("results", [result_row(image, res)])
+    def write_detections(self, image, summary, masks=None):
+        self._append("detections", detection_rows(image, summary, masks))
+    def _append(self, table, rows):
+        self._rows[table].extend(rows)
+        if len(self._rows[table])>=self.chunk_rows:
+            self._flush(table)
+    def _flush(self, table):
+        rows=self._rows[table]
+        if not rows:
+            return
+        self._rows[table]=[]
+        cols={name:_column(kind, [r.get(name) for r in rows]) for name,kind in TABLES[table]}
+        d=os.path.join(self.out_dir, table)
+        os.makedirs(d, exist_ok=True)
+        name=f"part-{self._parts[table]:05d}-{self._token}.{self.fmt}"
+        p=os.path.join(d, name)
+        # written under a dot name the readers' part-* glob skips, then renamed into place
+        tmp=os.path.join(d, f".tmp-{name}")
+        if self.fmt=="npz":
+            arrays={}
+            for name,kind in TABLES[table]:
+                if kind=="rle":
+                    arrays[name],arrays[name+"_offsets"]=cols[name]
+                else:
+                    arrays[name]=cols[name]
+            np.savez_compressed(tmp, **arrays)
+            os.replace(tmp, p)
+        else:
+            import pyarrow as pa, pyarrow.parquet as pq
+            arrays={}
+            for name,kind in TABLES[table]:
+                if kind=="rle":
+                    data,off=cols[name]
+                    arrays[name]=pa.LargeListArray.from_arrays(pa.array(off, pa.int64()), pa.array(data, pa.uint32()), mask=pa.array([r.get(name) is None for r in rows]))
+                elif kind=="str":
+                    arrays[name]=pa.array([r.get(name) for r in rows], pa.string())
+                else:
+                    arrays[name]=pa.array(cols[name])
+            pq.write_table(pa.table(arrays), tmp, compression="zstd")
+            os.replace(tmp, p)
+        self._parts[table]+=1
+    def close(self):
+        for t in TABLES:
+            self._flush(t)
+class ColumnarReader:
+    # Streams a dataset written by ColumnarWriter (format detected from the files present).
+    # iter_batches yields {column: numpy array} per chunk, RLE columns as lists of uint32 arrays (None = no mask);
+    # iter_rows yields dicts with timings/gemini/extra parsed and, with decode_masks, "mask": (roi, (x0,y0)).
+    def __init__(self, path:str):
+        self.path=path
+    def tables(self):
+        return [t for t in TABLES if glob.glob(os.path.join(self.path, t, "part-*.parquet")) or glob.glob(os.path.join(self.path, t, "part-*.npz"))]
+    def iter_batches(self, table:str="results", columns:Union[list,None]=None, batch_rows:int=65536):
+        names=[n for n,_ in TABLES[table] if columns is None or n in columns]
+        kinds=dict(TABLES[table])
+        for p in sorted(glob.glob(os.path.join(self.path, table, "part-*.parquet"))):
+            import pyarrow.parquet as pq
+            for b in pq.ParquetFile(p).iter_batches(batch_size=batch_rows, columns=names):
+                out={}
+                for n in names:
+                    col=b.column(n)
+                    if kinds[n]=="rle":
+                        out[n]=[None if v is None else np.asarray(v, np.uint32) for v in col.to_pylist()]
+                    elif kinds[n]=="str":
+                        out[n]=np.array(["" if v is None else v for v in col.to_pylist()])
+                    else:
+                        out[n]=col.to_numpy(zero_copy_only=False)
+                yield out
+        for p in sorted(glob.glob(os.path.join(self.path, table, "part-*.npz"))):
+            with np.load(p) as z:
+                out={}
+                for n in names:
+                    if kinds[n]=="rle":
+                        data,off=z[n],z[n+"_offsets"]
+                        out[n]=[data[a:b] if b>a else None for a,b in zip(off[:-1],off[1:])]
+                    else:
+                        out[n]=z[n]
+                yield out
+    def iter_rows(self, table:str="results", decode_masks:bool=False):
+        for batch in self.iter_batches(table):
+            cols=list(batch)
+            for i in range(len(batch[cols[0]])):
+                row={c:batch[c][i] for c in cols}
+                for c,v in row.items():
+                    if isinstance(v, np.generic):
+                        row[c]=v.item()
+                for c in ("timings","gemini","extra"):
+                    if c in row:
+                        row[c]=json.loads(row[c]) if row[c] else None
+                rle=row.pop("mask_rle", None)
+                if decode_masks and rle is not None:
+                    row["mask"]=(rle_decode(rle, (row["mask_h"], row["mask_w"])), (row["mask_x0"], row["mask_y0"]))
+                yield row
+    def read(self, table:str="results", columns:Union[list,None]=None):
+        # whole table as {column: array}; RLE columns stay lists
+        out={}
+        for b in self.iter_batches(table, columns):
+            for k,v in b.items():
+                out.setdefault(k,[]).append(v)
+        return {k:(list(itertools.chain.from_iterable(v)) if isinstance(v[0],list) else np.concatenate(v)) for k,v in out.items()}
@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Union
+from typing import List, Union
 load_dotenv()
 class Settings(BaseModel):
     gemini_api_key: Union[str, None] = os.getenv("GEMINI_API_KEY")
@@ -9,6 +9,35 @@ class Settings(BaseModel):
     yolo_model: str = os.getenv("YOLO_MODEL","yolov8n-seg.pt")
     yolo_conf: float = float(os.getenv("YOLO_CONF","0.25"))
     yolo_imgsz: Union[int, None] = int(os.getenv("YOLO_IMGSZ")) if os.getenv("YOLO_IMGSZ") else None
+    yolo_backend: str = os.getenv("YOLO_BACKEND","torch")
+    yolo_export_imgsz: int = int(os.getenv("YOLO_EXPORT_IMGSZ","640"))
+    yolo_int8: bool = os.getenv("YOLO_INT8","0").lower() in ("1","true","yes")
+    yolo_calib_dir: Union[str, None] = os.getenv("YOLO_CALIB_DIR")
+    yolo_export_dir: Union[str, None] = os.getenv("YOLO_EXPORT_DIR")
+    model_cache_mb: Union[float, None] = float(os.getenv("MODEL_CACHE_MB","2048")) or None
+    # unset: off for one-shot runs (cold start), on in the server and pool workers (see enable_warmup)
+    model_warmup: Union[bool, None] = os.getenv("MODEL_WARMUP").lower() in ("1","true","yes") if os.getenv("MODEL_WARMUP") else None
+    gemini_upload_max_side: Union[int, None] = int(os.getenv("GEMINI_UPLOAD_MAX_SIDE","1536")) or None
+    gemini_upload_max_bytes: Union[int, None] = int(os.getenv("GEMINI_UPLOAD_MAX_BYTES")) if os.getenv("GEMINI_UPLOAD_MAX_BYTES") else None
+    gemini_upload_quality: int = int(os.getenv("GEMINI_UPLOAD_QUALITY","85"))
+    gemini_cache_dir: Union[str, None] = os.getenv("GEMINI_CACHE_DIR")
+    api_concurrency: int = int(os.getenv("API_CONCURRENCY","4"))
+    api_timeout_s: Union[float, None] = float(os.getenv("API_TIMEOUT_S","60")) or None
+    api_retries: int = int(os.getenv("API_RETRIES","2"))
+    api_backoff_s: float = float(os.getenv("API_BACKOFF_S","0.5"))
+    stage_cache_dir: Union[str, None] = os.getenv("STAGE_CACHE_DIR")
+    stage_cache_max_mb: int = int(os.getenv("STAGE_CACHE_MAX_MB","512"))
+    decode_max_side: Union[int, None] = int(os.getenv("DECODE_MAX_SIDE")) if os.getenv("DECODE_MAX_SIDE") else None
+    container_classes: List[str] = [c.strip() for c in os.getenv("CONTAINER_CLASSES","bottle,wine glass,cup,bowl,vase").split(",") if c.strip()]
+    integrator: str = os.getenv("INTEGRATOR","raster")
+    integration_slices: int = int(os.getenv("INTEGRATION_SLICES","256"))
+    integration_method: str = os.getenv("INTEGRATION_METHOD","frustum")
     outlines_dir: str = os.getenv("OUTLINES_DIR","outputs/outlines")
+    artifacts_mode: str = os.getenv("ARTIFACTS_MODE","sync")
+    artifacts_workers: int = int(os.getenv("ARTIFACTS_WORKERS","2"))
+    artifacts_max_pending: int = int(os.getenv("ARTIFACTS_MAX_PENDING","16"))
+    artifacts_preview_max_side: Union[int, None] = int(os.getenv("ARTIFACTS_PREVIEW_MAX_SIDE")) if os.getenv("ARTIFACTS_PREVIEW_MAX_SIDE") else None
+    artifacts_fast: bool = os.getenv("ARTIFACTS_FAST","0").lower() in ("1","true","yes")
+    artifacts_sample_rate: float = float(os.getenv("ARTIFACTS_SAMPLE_RATE","1.0"))
 def get_settings() -> Settings:
     return Settings()
@@ -1,4 +1,52 @@
-import os, cv2
+import os, struct, cv2, numpy as np
+IMAGE_EXTS=(".jpg",".jpeg",".png",".bmp",".tif",".tiff",".webp")
+REDUCED={2:cv2.IMREAD_REDUCED_COLOR_2, 4:cv2.IMREAD_REDUCED_COLOR_4, 8:cv2.IMREAD_REDUCED_COLOR_8}
 def imwrite_safely(p, img):
     os.makedirs(os.path.dirname(p), exist_ok=True)
     cv2.imwrite(p, img)
+def jpeg_size(data):
+    # (w, h) from the first SOF marker without decoding, or None for non-JPEG/truncated data
+    if data[:2]!=b"\xff\xd8":
+        return None
+    i=2
+    while i+9<len(data):
+        if data[i]!=0xFF:
+            i+=1
+            continue
+        m=data[i+1]
+        if m in (0xD8,0x01) or 0xD0<=m<=0xD7 or m==0xFF:
+            i+=1 if m==0xFF else 2
+            continue
+        seg=struct.unpack(">H",data[i+2:i+4])[0]
+        if 0xC0<=m<=0xCF and m not in (0xC4,0xC8,0xCC):
+            h,w=struct.unpack(">HH",data[i+5:i+9])
+            return w,h
+        i+=2+seg
+    return None
+def reduction_for(size, max_side):
+    # largest libjpeg DCT scale-down (1/2, 1/4, 1/8) that keeps the long side >= max_side
+    if not size or not max_side:
+        return 1
+    for k in (8,4,2):
+        if max(size)/k>=max_side:
+            return k
+    return 1
+def decode(data, max_side=None):
+    # (BGR or None, scale = decoded px / original px). imdecode applies EXIF orientation (no
+    # IMREAD_IGNORE_ORIENTATION), for reduced decodes as well; only JPEGs get the DCT-domain reduction.
+    buf=np.frombuffer(data,np.uint8)
+    size=jpeg_size(data) if max_side else None
+    k=reduction_for(size, max_side)
+    bgr=cv2.imdecode(buf, REDUCED[k] if k>1 else cv2.IMREAD_COLOR)
+    if bgr is None or k==1:
+        return bgr, 1.0
+    return bgr, max(bgr.shape[:2])/max(size)
+def load_image(p, max_side=None):
+    # (raw file bytes, decoded BGR or None, decode scale); the bytes are kept for hashing/upload without a second read
+    with open(p,"rb") as f:
+        data=f.read()
+    bgr,scale=decode(data, max_side)
+    return data, bgr, scale
+def read_image(p):
+    data,bgr,_=load_image(p)
+    return data, bgr
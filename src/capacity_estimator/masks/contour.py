@@ -1,5 +1,8 @@
 import cv2, numpy as np
 class ContourMaskExtractor:
+    def __init__(self, coarse_max_side=640, band_px=3):
+        self.coarse_max_side=coarse_max_side
+        self.band_px=band_px
     def extract(self, gray):
         g=cv2.equalizeHist(gray)
         thr=cv2.adaptiveThreshold(g,255,cv2.ADAPTIVE_THRESH_GAUSSIAN_C,cv2.THRESH_BINARY_INV,31,2)
@@ -11,4 +14,42 @@ class ContourMaskExtractor:
         cnt=max(cnts, key=cv2.contourArea)
         mask=np.zeros_like(thr)
         cv2.drawContours(mask,[cnt],-1,255,thickness=cv2.FILLED)
-        return (mask>0).astype(np.uint8), cnt
\ No newline at end of file
+        return (mask>0).astype(np.uint8), cnt
+    def extract_bgr(self, bgr):
+        # Coarse-to-fine: extract() on a copy with the long side <= coarse_max_side, then re-decide only the
+        # pixels in a band around the upscaled boundary at full resolution (Otsu on the band's own gray
+        # values). Returns (roi_mask 0/1, (x0,y0), cnt in frame coords) like YOLOMaskExtractor.extract_roi.
+        h,w=bgr.shape[:2]
+        s=min(1.0, self.coarse_max_side/max(h,w)) if self.coarse_max_side else 1.0
+        small=cv2.resize(bgr,(max(1,round(w*s)),max(1,round(h*s))),interpolation=cv2.INTER_AREA) if s<1.0 else bgr
+        _,cnt=self.extract(cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY),(5,5),0))
+        sh,sw=small.shape[:2]
+        b=self.band_px
+        x,y,bw,bh=cv2.boundingRect(cnt)
+        cx0,cy0,cx1,cy1=max(x-b-1,0),max(y-b-1,0),min(x+bw+b+1,sw),min(y+bh+b+1,sh)
+        m=np.zeros((cy1-cy0,cx1-cx0),np.uint8)
+        cv2.drawContours(m,[cnt],-1,1,thickness=cv2.FILLED,offset=(-cx0,-cy0))
+        k=np.ones((2*b+1,2*b+1),np.uint8)
+        # band = coarse pixels within b of the boundary; everything else keeps its coarse label
+        label=cv2.erode(m,k)+cv2.dilate(m,k)   # 2 core, 1 band, 0 outside
+        x0,y0=int(round(cx0*w/sw)),int(round(cy0*h/sh))
+        x1,y1=int(round(cx1*w/sw)),int(round(cy1*h/sh))
+        label=cv2.resize(label,(x1-x0,y1-y0),interpolation=cv2.INTER_NEAREST)
+        gray=cv2.GaussianBlur(cv2.cvtColor(np.ascontiguousarray(bgr[y0:y1,x0:x1]), cv2.COLOR_BGR2GRAY),(5,5),0)
+        ring=label==1
+        inside,outside=gray[label==2],gray[label==0]
+        mask=(label>=1).astype(np.uint8)
+        if ring.any() and inside.size and outside.size and abs(float(np.median(inside))-float(np.median(outside)))>=8:
+            t,_=cv2.threshold(gray[ring].reshape(1,-1),0,255,cv2.THRESH_BINARY+cv2.THRESH_OTSU)
+            obj=(gray<=t) if np.median(inside)<np.median(outside) else (gray>t)
+            mask=((label==2)|(ring&obj)).astype(np.uint8)
+        else:
+            mask=cv2.resize(m,(x1-x0,y1-y0),interpolation=cv2.INTER_NEAREST)
+        cnts,_=cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x0,y0))
+        if not cnts:
+            raise RuntimeError("No contours found")
+        cnt=max(cnts, key=cv2.contourArea)
+        rx,ry,rw,rh=cv2.boundingRect(cnt)
+        roi=np.zeros((rh,rw),np.uint8)
+        cv2.drawContours(roi,[cnt],-1,1,thickness=cv2.FILLED,offset=(-rx,-ry))
+        return roi, (rx,ry), cnt
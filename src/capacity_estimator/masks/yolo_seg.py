@@ -1,22 +1,71 @@
-import cv2, numpy as np
-from ultralytics import YOLO
-_yolo_cache={}
+import cv2, math, numpy as np
+from ..backends import load_yolo, model_key
+from ..registry import get_registry, yolo_warmup
+ROI_PAD=12
 class YOLOMaskExtractor:
-    def __init__(self, model_name="yolov8n-seg.pt", conf=0.25, imgsz=None):
+    def __init__(self, model_name="yolov8n-seg.pt", conf=0.25, imgsz=None, backend=None):
+        # backend: backends.load_yolo kwargs (backend, imgsz, int8, calib_dir, export_dir); None runs torch
         self.model_name=model_name
         self.conf=conf
         self.imgsz=imgsz
-        if model_name not in _yolo_cache:
-            _yolo_cache[model_name]=YOLO(model_name)
-        self.model=_yolo_cache[model_name]
-    def extract(self, bgr):
+        self.backend=dict(backend) if backend and backend.get("backend","torch")!="torch" else None
+    @property
+    def model_id(self):
+        # weights plus backend, for cache keys
+        return model_key(self.model_name, self.backend)
+    @property
+    def model(self):
+        # ultralytics (and torch) are imported and the weights loaded on first use, not at construction; looked up
+        # in the shared registry on every use so an evicted checkpoint is not kept alive here
+        def load():
+            return load_yolo(self.model_name, **(self.backend or {}))
+        return get_registry().get(self.model_id, load, yolo_warmup(self.backend.get("imgsz",640) if self.backend else self.imgsz or 640))
+    def _imgsz(self, bgr):
+        if self.backend is not None:
+            # exported graphs have a static input size
+            return self.backend.get("imgsz",640)
         h,w=bgr.shape[:2]
-        imgsz=self.imgsz or max(640,min(h,w))
-        res=self.model.predict(bgr, imgsz=imgsz, conf=self.conf, iou=0.5, verbose=False)[0]
+        return self.imgsz or max(640,min(h,w))
+    def extract(self, bgr):
+        return paste_roi(*self.extract_roi(bgr), bgr.shape[:2])
+    def extract_roi(self, bgr):
+        # (roi_mask, (x0,y0), cnt): selected mask cropped to its padded bbox, contour in full-frame coords
+        res=self.model.predict(bgr, imgsz=self._imgsz(bgr), conf=self.conf, iou=0.5, verbose=False)[0]
+        return self._postprocess(res, bgr.shape[:2])
+    def extract_all(self, bgr, classes=None):
+        # every instance from one predict call: [(roi_mask, (x0,y0), cnt, label_name, confidence), ...] sorted by
+        # mask area, largest first; classes: label names to keep (None keeps all)
+        res=self.model.predict(bgr, imgsz=self._imgsz(bgr), conf=self.conf, iou=0.5, verbose=False)[0]
+        return self._all(res, bgr.shape[:2], classes)
+    def extract_batch(self, bgrs, roi=False, multi=False, classes=None):
+        # One predict call per group of frames sharing an inference size; failures are returned, not raised.
+        # multi returns extract_all() lists instead of the single selected mask.
+        out=[None]*len(bgrs)
+        groups={}
+        for i,b in enumerate(bgrs):
+            groups.setdefault(self._imgsz(b),[]).append(i)
+        for imgsz,idx in groups.items():
+            try:
+                results=self.model.predict([bgrs[i] for i in idx], imgsz=imgsz, conf=self.conf, iou=0.5, verbose=False)
+            except Exception as e:
+                results=[e]*len(idx)
+            for i,res in zip(idx,results):
+                if isinstance(res, Exception):
+                    out[i]=res
+                    continue
+                try:
+                    if multi:
+                        out[i]=self._all(res, bgrs[i].shape[:2], classes)
+                        continue
+                    r=self._postprocess(res, bgrs[i].shape[:2])
+                    out[i]=r if roi else paste_roi(*r, bgrs[i].shape[:2])
+                except Exception as e:
+                    out[i]=e
+        return out
+    def _postprocess(self, res, shape):
         if res.masks is None or len(res.masks.data)==0:
             raise RuntimeError("YOLO-Seg found no instances")
-        raw=res.masks.data.cpu().numpy()
-        masks=[cv2.resize((m>0.5).astype(np.uint8)*255,(w,h),interpolation=cv2.INTER_NEAREST) for m in raw]
+        data=res.masks.data
         names=res.names if isinstance(res.names,dict) else {i:n for i,n in enumerate(res.names)}
         cls_ids=res.boxes.cls.cpu().numpy().astype(int) if res.boxes.cls is not None else []
         pick=None
@@ -25,12 +74,72 @@ class YOLOMaskExtractor:
                 pick=i
                 break
         if pick is None:
-            areas=[int(m.sum()) for m in masks]
+            # areas at prototype resolution; the upsampling is a uniform scale so the argmax is unchanged
+            areas=(data>0.5).sum(dim=(1,2)).cpu().numpy()
             pick=int(np.argmax(areas))
-        mask=masks[pick]
-        mask=cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5,5),np.uint8), iterations=2)
-        cnts,_=cv2.findContours((mask>0).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if not cnts:
-            raise RuntimeError("Empty mask after postprocess")
-        cnt=max(cnts, key=cv2.contourArea)
-        return (mask>0).astype(np.uint8), cnt
\ No newline at end of file
+        return _roi((data[pick]>0.5).cpu().numpy(), shape)
+    def _all(self, res, shape, classes=None):
+        if res.masks is None or len(res.masks.data)==0:
+            raise RuntimeError("YOLO-Seg found no instances")
+        names=res.names if isinstance(res.names,dict) else {i:n for i,n in enumerate(res.names)}
+        cls_ids=res.boxes.cls.cpu().numpy().astype(int)
+        confs=res.boxes.conf.cpu().numpy()
+        keep={c.lower() for c in classes} if classes else None
+        data=(res.masks.data>0.5).cpu().numpy()
+        out=[]
+        for i in np.argsort(-data.sum(axis=(1,2)), kind="stable"):
+            name=str(names.get(int(cls_ids[i]),""))
+            if keep is not None and name.lower() not in keep:
+                continue
+            try:
+                out.append(_roi(data[i], shape)+(name, float(confs[i])))
+            except RuntimeError:
+                continue
+        if not out:
+            raise RuntimeError("YOLO-Seg found no matching instances")
+        return out
+def _roi(m, shape):
+    # m: bool mask at prototype resolution -> (roi 0/1 on the frame grid, (x0,y0), cnt in frame coords)
+    h,w=shape
+    mh,mw=m.shape
+    ys,xs=np.where(m)
+    if ys.size==0:
+        raise RuntimeError("Empty mask after postprocess")
+    sx,sy=w/mw,h/mh
+    x0=max(int(xs.min()*sx)-ROI_PAD,0); x1=min(int(math.ceil((xs.max()+1)*sx))+ROI_PAD,w)
+    y0=max(int(ys.min()*sy)-ROI_PAD,0); y1=min(int(math.ceil((ys.max()+1)*sy))+ROI_PAD,h)
+    # nearest-neighbour upsampling of the ROI only, same sampling as a full-frame INTER_NEAREST resize
+    ix=np.minimum((np.arange(x0,x1)*(mw/w)).astype(np.intp),mw-1)
+    iy=np.minimum((np.arange(y0,y1)*(mh/h)).astype(np.intp),mh-1)
+    mask=m[iy[:,None],ix[None,:]].astype(np.uint8)*255
+    mask=cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5,5),np.uint8), iterations=2)
+    cnts,_=cv2.findContours((mask>0).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x0,y0))
+    if not cnts:
+        raise RuntimeError("Empty mask after postprocess")
+    cnt=max(cnts, key=cv2.contourArea)
+    return (mask>0).astype(np.uint8), (x0,y0), cnt
+def instance_rois(res, shape):
+    # [(roi 0/1, (x0,y0)) or None, ...] for every instance of an ultralytics result, in box order, sampled onto
+    # the frame like _postprocess (nearest neighbour, ROI only) but without the morphological close
+    h,w=shape[:2]
+    if res.masks is None:
+        return []
+    data=(res.masks.data>0.5).cpu().numpy()
+    out=[]
+    for m in data:
+        mh,mw=m.shape
+        ys,xs=np.where(m)
+        if ys.size==0:
+            out.append(None)
+            continue
+        x0=int(xs.min()*w/mw); x1=min(int(math.ceil((xs.max()+1)*w/mw)),w)
+        y0=int(ys.min()*h/mh); y1=min(int(math.ceil((ys.max()+1)*h/mh)),h)
+        ix=np.minimum((np.arange(x0,x1)*(mw/w)).astype(np.intp),mw-1)
+        iy=np.minimum((np.arange(y0,y1)*(mh/h)).astype(np.intp),mh-1)
+        out.append((m[iy[:,None],ix[None,:]].astype(np.uint8), (x0,y0)))
+    return out
+def paste_roi(roi, offset, cnt, shape):
+    full=np.zeros(shape[:2], np.uint8)
+    x0,y0=offset
+    full[y0:y0+roi.shape[0], x0:x0+roi.shape[1]]=roi
+    return full, cnt
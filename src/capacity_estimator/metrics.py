@@ -0,0 +1,83 @@
+import os, json, time, threading, bisect
+from contextlib import contextmanager
+BUCKETS=(0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0,30.0)
+class MetricsRegistry:
+    # Process-wide stage counters and latency histograms, exportable in Prometheus text format.
+    def __init__(self, prefix="capacity_estimator", buckets=BUCKETS):
+        self.prefix=prefix
+        self.buckets=tuple(buckets)
+        self._lock=threading.Lock()
+        self._hist={}
+        self._counters={}
+    def observe(self, stage, seconds):
+        with self._lock:
+            h=self._hist.get(stage)
+            if h is None:
+                h=self._hist[stage]={"buckets":[0]*(len(self.buckets)+1),"sum":0.0,"count":0}
+            h["buckets"][bisect.bisect_left(self.buckets, seconds)]+=1
+            h["sum"]+=seconds
+            h["count"]+=1
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name]=self._counters.get(name,0)+value
+    def render_prometheus(self):
+        with self._lock:
+            lines=[]
+            for name,v in sorted(self._counters.items()):
+                lines+=[f"# TYPE {self.prefix}_{name}_total counter", f"{self.prefix}_{name}_total {v}"]
+            if self._hist:
+                n=f"{self.prefix}_stage_seconds"
+                lines.append(f"# TYPE {n} histogram")
+                for stage,h in sorted(self._hist.items()):
+                    acc=0
+                    for le,c in zip(self.buckets+("+Inf",), h["buckets"]):
+                        acc+=c
+                        lines.append(f'{n}_bucket{{stage="{stage}",le="{le}"}} {acc}')
+                    lines.append(f'{n}_sum{{stage="{stage}"}} {h["sum"]:.6f}')
+                    lines.append(f'{n}_count{{stage="{stage}"}} {h["count"]}')
+            return "\n".join(lines)+"\n"
+    def reset(self):
+        with self._lock:
+            self._hist.clear(); self._counters.clear()
+REGISTRY=MetricsRegistry()
+class StageTimer:
+    # Wall time per stage for one run (ms, summed if a stage repeats) plus Chrome-trace events.
+    def __init__(self, registry=REGISTRY):
+        self.registry=registry
+        self.timings={}
+        self.events=[]
+        self._lock=threading.Lock()
+    @contextmanager
+    def stage(self, name):
+        t0=time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, t0, time.perf_counter())
+    def record(self, name, t0, t1):
+        dt=t1-t0
+        with self._lock:
+            self.timings[name]=self.timings.get(name,0.0)+dt*1000.0
+            self.events.append({"name":name,"ph":"X","ts":t0*1e6,"dur":dt*1e6,"pid":os.getpid(),"tid":threading.get_ident()})
+        if self.registry is not None:
+            self.registry.observe(name, dt)
+    def chrome_trace(self):
+        t0=min((e["ts"] for e in self.events), default=0.0)
+        return {"traceEvents":[{**e,"ts":e["ts"]-t0} for e in self.events],"displayTimeUnit":"ms"}
+    def save_chrome_trace(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path,"w") as f:
+            json.dump(self.chrome_trace(), f)
+@contextmanager
+def timed(timer, name):
+    # times into `timer` when given, otherwise only into the global registry
+    if timer is not None:
+        with timer.stage(name):
+            yield
+        return
+    t0=time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter()-t0)
@@ -16,4 +16,7 @@ class Result(BaseModel):
     crop: List[int]
     outline_path: Union[str, None] = None
     scale_mm_per_px: Union[float, None] = None
+    scale_uncertainty_mm_per_px: Union[float, None] = None
     gemini: Union[Dict[str,Any], None] = None
+    timings: Union[Dict[str,float], None] = None
+    instances: Union[List[Dict[str,Any]], None] = None
@@ -0,0 +1,158 @@
+import os, importlib, itertools, multiprocessing as mp, numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from typing import Union
+from .image_io import load_image
+THREAD_ENV=("OMP_NUM_THREADS","MKL_NUM_THREADS","OPENBLAS_NUM_THREADS","OPENCV_NUM_THREADS")
+_worker=None
+def share(arr):
+    # copies arr into a new shared-memory block; returns (block, descriptor) - the creator unlinks the block
+    shm=shared_memory.SharedMemory(create=True, size=max(1,arr.nbytes))
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...]=arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+def attach(desc):
+    # (block, array view); close() the block once the view is no longer used. Workers share the parent's
+    # resource tracker, whose registry is a set, so attaching does not need to unregister anything.
+    name,shape,dtype=desc
+    shm=shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+def take(desc):
+    # copy out of a block created by the other side and free it
+    shm,arr=attach(desc)
+    try:
+        return arr.copy()
+    finally:
+        del arr
+        shm.close(); shm.unlink()
+def resolve(spec):
+    mod,fn=spec.split(":")
+    return getattr(importlib.import_module(mod), fn)
+def capacity_worker(artifacts_mode=None, **pipeline_kwargs):
+    # worker factory: one CapacityPipeline per process, models loaded before the first task. Artifacts are
+    # written inline: a background writer's queue would be lost when the pool shuts the process down.
+    from .artifacts import ArtifactWriter
+    from .config import get_settings
+    from .pipeline import CapacityPipeline
+    from .registry import enable_warmup
+    s=get_settings()
+    enable_warmup()
+    mode=artifacts_mode or s.artifacts_mode
+    pipe=CapacityPipeline(artifacts=ArtifactWriter.from_settings(s, mode="sync" if mode=="background" else mode), **pipeline_kwargs)
+    try:
+        pipe.yolo.model
+    except Exception:
+        pass
+    def run(bgr, path, image_bytes, decode_scale, mask_sink=None, **kw):
+        if kw.get("multi"):
+            return pipe.process_frame_multi(bgr, path, kw.get("mm_per_px"), kw.get("aruco_mm"), kw.get("wall_mm",0.0), kw.get("crop_margin",20), kw.get("use_gemini",False), image_bytes=image_bytes, decode_scale=decode_scale)
+        dbg=os.path.join(kw["debug_dir"], os.path.splitext(os.path.basename(path))[0]) if kw.get("debug_dir") else None
+        return pipe.process_frame(bgr, path, kw.get("mm_per_px"), kw.get("aruco_mm"), kw.get("wall_mm",0.0), dbg, kw.get("crop_margin",20), kw.get("use_gemini",False), image_bytes=image_bytes, decode_scale=decode_scale, mask_sink=mask_sink)
+    run.decode_max_side=pipe.decode_max_side
+    return run
+def _init(factory, factory_kwargs, threads):
+    global _worker
+    for k in THREAD_ENV:
+        os.environ[k]=str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+    _worker=resolve(factory)(**factory_kwargs)
+def _task(path, frame_desc, image_bytes, decode_scale, return_mask, kw):
+    shm=None
+    try:
+        if frame_desc is None:
+            image_bytes,bgr,decode_scale=load_image(path, getattr(_worker,"decode_max_side",None))
+            if bgr is None:
+                return {"error":f"Could not read image: {path}"}
+        else:
+            shm,bgr=attach(frame_desc)
+        sink=None; masks=[]
+        if return_mask:
+            def sink(mask_roi, offset, cnt):
+                m,desc=share(np.ascontiguousarray(mask_roi, np.uint8))
+                m.close()
+                masks.append({"shm":desc, "offset":[int(offset[0]),int(offset[1])], "decode_scale":decode_scale})
+        try:
+            res=_worker(bgr, path, image_bytes, decode_scale, mask_sink=sink, **kw)
+        except Exception as e:
+            res={"error":str(e)}
+        if masks:
+            res["mask"]=masks[-1]
+        return res
+    except Exception as e:
+        return {"error":str(e)}
+    finally:
+        if shm is not None:
+            del bgr
+            shm.close()
+class ParallelRunner:
+    # Spreads images over worker processes, each built once by `factory` ("module:function" returning
+    # fn(bgr, path, image_bytes, decode_scale, mask_sink=None, **kw) -> dict) with torch/OpenCV limited to
+    # threads_per_worker. Paths are decoded inside the workers; in-memory frames and returned masks cross
+    # the process boundary through shared memory. Results come back in input order or as they complete.
+    def __init__(self, workers:Union[int,None]=None, threads_per_worker:Union[int,None]=None, factory:str="capacity_estimator.parallel:capacity_worker", factory_kwargs:Union[dict,None]=None, max_inflight:Union[int,None]=None, start_method:str="spawn"):
+        cpus=os.cpu_count() or 1
+        self.workers=workers or max(1,cpus//2)
+        self.threads=threads_per_worker or max(1,cpus//self.workers)
+        self.max_inflight=max_inflight or 2*self.workers
+        self._pool=ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context(start_method), initializer=_init, initargs=(factory, factory_kwargs or {}, self.threads))
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
+    def close(self):
+        self._pool.shutdown(wait=True)
+    def _finish(self, item, fut):
+        shm=item[2]
+        if shm is not None:
+            shm.close(); shm.unlink()
+        try:
+            res=fut.result()
+        except Exception as e:
+            res={"error":str(e)}
+        if isinstance(res,dict) and isinstance(res.get("mask"),dict):
+            res["mask"]={"roi":take(res["mask"]["shm"]), "offset":res["mask"]["offset"], "decode_scale":res["mask"].get("decode_scale",1.0)}
+        return item[0], res
+    def _run(self, items, ordered, return_masks, kw):
+        # items: (key, path, frame or None, image_bytes, decode_scale)
+        pending=deque() if ordered else set()
+        futs={}
+        items=iter(items)
+        while True:
+            for key,path,frame,data,ds in itertools.islice(items, self.max_inflight-len(futs)):
+                shm,desc=share(np.ascontiguousarray(frame)) if frame is not None else (None,None)
+                fut=self._pool.submit(_task, path, desc, data if frame is not None else None, ds, return_masks, kw)
+                futs[fut]=(key,path,shm)
+                if ordered:
+                    pending.append(fut)
+                else:
+                    pending.add(fut)
+            if not futs:
+                return
+            if ordered:
+                fut=pending.popleft()
+                wait([fut])
+                yield self._finish(futs.pop(fut), fut)
+            else:
+                done,_=wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    pending.discard(fut)
+                    yield self._finish(futs.pop(fut), fut)
+    def map_paths(self, paths, ordered:bool=True, return_masks:bool=False, **kw):
+        # yields (path, result); each worker reads and decodes its own images
+        return self._run(((p,p,None,None,1.0) for p in paths), ordered, return_masks, kw)
+    def map_frames(self, frames, ordered:bool=True, return_masks:bool=False, **kw):
+        # frames: (name, bgr) or (name, bgr, image_bytes, decode_scale); yields (name, result)
+        def items():
+            for f in frames:
+                name,bgr=f[0],f[1]
+                data=f[2] if len(f)>2 else None
+                ds=f[3] if len(f)>3 else 1.0
+                yield name,name,bgr,data,ds
+        return self._run(items(), ordered, return_masks, kw)
@@ -1,64 +1,309 @@
-import os, json, cv2, numpy as np
+import os, json, time, itertools, cv2, numpy as np
 from .config import get_settings
 from .models import Result
-from .image_io import imwrite_safely
+from .image_io import imwrite_safely, load_image
+from .cache import StageCache
+from .metrics import StageTimer, REGISTRY
 from .masks import YOLOMaskExtractor, ContourMaskExtractor
+from .masks.yolo_seg import paste_roi
 from .geometry import RotationAligner, VolumeIntegrator
-from .scale import ArucoScaleEstimator, GeminiScaleEstimator
+from .scale import ArucoScaleEstimator, GeminiScaleEstimator, UploadPolicy
+from .scale.gemini import _scale_meta
 from .viz import OutlineDrawer
-from typing import Union
+from .artifacts import ArtifactWriter
+from .backends import backend_from_settings
+from typing import Union, Iterable
+INTEGRATORS=("raster","contour")
 class CapacityPipeline:
-    def __init__(self, yolo_model:Union[str,None]=None, yolo_conf:Union[float,None]=None, yolo_imgsz:Union[int,None]=None, outlines_dir:Union[str,None]=None, gemini_api_key:Union[str,None]=None, gemini_model:Union[str,None]=None):
+    def __init__(self, yolo_model:Union[str,None]=None, yolo_conf:Union[float,None]=None, yolo_imgsz:Union[int,None]=None, outlines_dir:Union[str,None]=None, gemini_api_key:Union[str,None]=None, gemini_model:Union[str,None]=None, stage_cache_dir:Union[str,None]=None, artifacts:Union[ArtifactWriter,None]=None, decode_max_side:Union[int,None]=None, yolo_backend:Union[str,None]=None, integrator:Union[str,None]=None, integration_slices:Union[int,None]=None):
         s=get_settings()
+        # frames are decoded at 1/2, 1/4 or 1/8 when the long side stays >= decode_max_side; results stay in original px
+        self.decode_max_side=decode_max_side if decode_max_side is not None else s.decode_max_side
         self.outlines_dir=outlines_dir or s.outlines_dir
-        self.yolo=YOLOMaskExtractor(model_name=yolo_model or s.yolo_model, conf=yolo_conf if yolo_conf is not None else s.yolo_conf, imgsz=yolo_imgsz if yolo_imgsz is not None else s.yolo_imgsz)
+        self.yolo=YOLOMaskExtractor(model_name=yolo_model or s.yolo_model, conf=yolo_conf if yolo_conf is not None else s.yolo_conf, imgsz=yolo_imgsz if yolo_imgsz is not None else s.yolo_imgsz, backend=backend_from_settings(s, yolo_backend))
         self.contour=ContourMaskExtractor()
         self.rot=RotationAligner()
         self.intg=VolumeIntegrator()
+        # "raster": warp the mask and scan pixel rows; "contour": slice the rotated contour polygon (no warp)
+        self.integrator=integrator or s.integrator
+        if self.integrator not in INTEGRATORS:
+            raise ValueError(f"integrator must be one of {INTEGRATORS}")
+        self.integration_slices=integration_slices or s.integration_slices
+        self.integration_method=s.integration_method
+        # label names measured in multi-instance mode (empty: every instance)
+        self.container_classes=s.container_classes
         self.aruco=ArucoScaleEstimator()
-        self.gemini=GeminiScaleEstimator(api_key=gemini_api_key if gemini_api_key is not None else s.gemini_api_key, model=gemini_model or s.gemini_model)
+        self.gemini=GeminiScaleEstimator(api_key=gemini_api_key if gemini_api_key is not None else s.gemini_api_key, model=gemini_model or s.gemini_model, upload_policy=UploadPolicy(max_side=s.gemini_upload_max_side, max_bytes=s.gemini_upload_max_bytes, jpeg_quality=s.gemini_upload_quality), cache_dir=s.gemini_cache_dir)
         self.drawer=OutlineDrawer()
-    def process(self, image_path:str, mm_per_px:Union[float,None], aruco_mm:Union[float,None], wall_mm:float, debug_dir:Union[str,None], crop_margin:int, use_gemini:bool):
-        bgr=cv2.imread(image_path)
+        self.artifacts=artifacts or ArtifactWriter.from_settings(s)
+        stage_cache_dir=stage_cache_dir or s.stage_cache_dir
+        self.stage_cache=StageCache(stage_cache_dir, s.stage_cache_max_mb*1024*1024) if stage_cache_dir else None
+    def process(self, image_path:str, mm_per_px:Union[float,None], aruco_mm:Union[float,None], wall_mm:float, debug_dir:Union[str,None], crop_margin:int, use_gemini:bool, timer:Union[StageTimer,None]=None, multi:bool=False):
+        timer=timer or StageTimer()
+        with timer.stage("decode"):
+            data,bgr,decode_scale=load_image(image_path, self.decode_max_side)
         if bgr is None:
             raise FileNotFoundError(image_path)
-        base=os.path.splitext(os.path.basename(image_path))[0]
-        gray=cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-        gray_blur=cv2.GaussianBlur(gray,(5,5),0)
+        if multi:
+            return self.process_frame_multi(bgr, image_path, mm_per_px, aruco_mm, wall_mm, crop_margin, use_gemini, image_bytes=data, timer=timer, decode_scale=decode_scale)
+        return self.process_frame(bgr, image_path, mm_per_px, aruco_mm, wall_mm, debug_dir, crop_margin, use_gemini, image_bytes=data, timer=timer, decode_scale=decode_scale)
+    def process_batch(self, image_paths:Iterable[str], mm_per_px:Union[float,None], aruco_mm:Union[float,None], wall_mm:float, debug_dir:Union[str,None], crop_margin:int, use_gemini:bool, batch_size:int=8, return_masks:bool=False, multi:bool=False):
+        # Yields (image_path, result_or_error) in input order; YOLO sees batch_size frames per predict call.
+        # multi measures every container instance (process_frame_multi); return_masks does not apply then.
+        # return_masks adds result["mask"]={"roi","offset","decode_scale"} (decoded px) like ParallelRunner.
+        it=iter(image_paths)
+        while True:
+            paths=list(itertools.islice(it, max(1,batch_size)))
+            if not paths:
+                return
+            loaded=[]
+            timers=[StageTimer() for _ in paths]
+            for p,timer in zip(paths,timers):
+                try:
+                    with timer.stage("decode"):
+                        loaded.append(load_image(p, self.decode_max_side))
+                except OSError:
+                    loaded.append((None,None,1.0))
+            frames=[f for _,f,_ in loaded]
+            # frames already in the stage cache skip segmentation entirely
+            # one cache read per frame, handed on to process_frame (False = known miss)
+            cached={i:(self._cached_stages(d, ds) or False) for i,(d,f,ds) in enumerate(loaded) if f is not None and not multi}
+            ok=[i for i,(d,f,ds) in enumerate(loaded) if f is not None and (multi or not cached[i])]
+            t0=time.perf_counter()
+            segs=dict(zip(ok, self.yolo.extract_batch([frames[i] for i in ok], roi=True, multi=multi, classes=self.container_classes))) if ok else {}
+            if ok:
+                # the batched predict call is attributed to its frames in equal shares
+                share=(time.perf_counter()-t0)/len(ok)
+                for i in ok:
+                    timers[i].record("segmentation", t0, t0+share)
+            for i,p in enumerate(paths):
+                if frames[i] is None:
+                    yield p, {"error":f"Could not read image: {p}"}
+                    continue
+                dbg=os.path.join(debug_dir, os.path.splitext(os.path.basename(p))[0]) if debug_dir else None
+                if multi:
+                    try:
+                        yield p, self.process_frame_multi(frames[i], p, mm_per_px, aruco_mm, wall_mm, crop_margin, use_gemini, seg=segs.get(i), image_bytes=loaded[i][0], timer=timers[i], decode_scale=loaded[i][2])
+                    except Exception as e:
+                        REGISTRY.inc("frames_failed")
+                        yield p, {"error":str(e)}
+                    continue
+                masks=[]
+                sink=(lambda roi, offset, cnt: masks.append({"roi":roi, "offset":[int(offset[0]),int(offset[1])], "decode_scale":loaded[i][2]})) if return_masks else None
+                try:
+                    res=self.process_frame(frames[i], p, mm_per_px, aruco_mm, wall_mm, dbg, crop_margin, use_gemini, seg=segs.get(i), image_bytes=loaded[i][0], timer=timers[i], decode_scale=loaded[i][2], mask_sink=sink, cached=cached.get(i))
+                    if masks:
+                        res["mask"]=masks[-1]
+                    yield p, res
+                except Exception as e:
+                    REGISTRY.inc("frames_failed")
+                    yield p, {"error":str(e)}
+    def segment(self, bgr):
+        # (mask_roi, offset, cnt) from YOLO, falling back to the contour extractor
         try:
-            mask_bin, cnt=self.yolo.extract(bgr)
+            return self.yolo.extract_roi(bgr)
         except Exception:
-            mask_bin, cnt=self.contour.extract(gray_blur)
-        outline_path=self.drawer.draw_and_save(bgr, cnt, self.outlines_dir, base)
-        _, mask_r, rot=self.rot.rotate_to_vertical(bgr, (mask_bin*255).astype(np.uint8), cnt)
-        ys,xs=np.where(mask_r>0)
-        if ys.size==0 or xs.size==0:
+            return self.contour.extract_bgr(bgr)
+    def measure(self, shape, mask_roi, offset, cnt, mm_per_px:Union[float,None], wall_mm:float, crop_margin:int, rot:Union[float,None]=None):
+        # rotation + integration for an already segmented object; pixel units when mm_per_px is None
+        mask_r, rot, (y1,y2,x1,x2)=self._rotate(mask_roi, offset, cnt, shape, crop_margin, rot)
+        v,h=self._integrate(mask_r, cnt, rot, mm_per_px, wall_mm)
+        if mm_per_px is None:
+            units={"volume":"px^3","height":"px"}
+        else:
+            v/=1000.0
+            units={"volume":"mL","height":"mm"}
+        return {"volume":float(v), "height":float(h), "units":units, "scale_mm_per_px":None if mm_per_px is None else float(mm_per_px), "rotation_applied_deg":float(rot), "crop":[int(y1),int(y2),int(x1),int(x2)]}
+    def _rotate(self, mask_roi, offset, cnt, shape, crop_margin, rot=None, need_mask=False):
+        # (rotated mask crop or None, rot, crop); the contour integrator only needs the angle and crop
+        if self.integrator=="contour" and not need_mask:
+            rot=self.rot.angle(cnt) if rot is None else rot
+            _,crop=self.rot.rotated_bounds(cnt, rot, shape, crop_margin)
+            return None, rot, crop
+        mask_r, rot, crop=self.rot.rotate_mask_roi((mask_roi*255).astype(np.uint8), offset, cnt, shape, crop_margin, rot=rot)
+        if not mask_r.any():
             raise RuntimeError("Mask vanished after rotation")
-        y1,y2=max(ys.min()-crop_margin,0), min(ys.max()+crop_margin, mask_r.shape[0]-1)
-        x1,x2=max(xs.min()-crop_margin,0), min(xs.max()+crop_margin, mask_r.shape[1]-1)
-        mask_r=mask_r[y1:y2+1, x1:x2+1]
+        return mask_r, rot, crop
+    def _integrate(self, mask_r, cnt, rot, mm_per_px=None, wall_mm=0.0):
+        if self.integrator=="contour":
+            return self.intg.integrate_contour(cnt, mm_per_px, wall_mm, rot=rot, slices=self.integration_slices, method=self.integration_method)
+        if mm_per_px is None:
+            return self.intg.integrate_px(mask_r)
+        return self.intg.integrate_mm(mask_r, mm_per_px, wall_mm)
+    def _stage_key(self, image_bytes, decode_scale=1.0):
+        if self.stage_cache is None or image_bytes is None:
+            return None
+        return self.stage_cache.key(image_bytes, self.yolo.model_id, self.yolo.conf, self.yolo.imgsz, decode_scale)
+    def _cached_stages(self, image_bytes, decode_scale=1.0):
+        key=self._stage_key(image_bytes, decode_scale)
+        return self.stage_cache.get(key) if key else None
+    def process_frame(self, bgr, image_path:str, mm_per_px:Union[float,None], aruco_mm:Union[float,None], wall_mm:float, debug_dir:Union[str,None], crop_margin:int, use_gemini:bool, seg=None, image_bytes:Union[bytes,None]=None, timer:Union[StageTimer,None]=None, decode_scale:float=1.0, mask_sink=None, scale_fn=None, cached=None):
+        # cached: stage-cache entry already read by the caller, False for a known miss, None to look it up here
+        # seg: precomputed YOLOMaskExtractor.extract_roi result ((roi_mask, offset, cnt) or the exception it raised)
+        # mask_sink: optional callable(mask_roi, offset, cnt) that receives the selected mask
+        # decode_scale: bgr px / original px; mm_per_px, Gemini metadata and pixel-unit results refer to original px
+        # scale_fn: replaces self.gemini.estimate_mm_per_px (same signature), e.g. to route the call through an ApiLimiter
+        timer=timer or StageTimer()
+        REGISTRY.inc("frames_processed")
+        base=os.path.splitext(os.path.basename(image_path))[0]
+        with timer.stage("stage_cache"):
+            key=self._stage_key(image_bytes, decode_scale)
+            if cached is None:
+                cached=self.stage_cache.get(key) if key else None
+        if cached:
+            mask_roi, offset, cnt, rot=cached
+        else:
+            rot=None
+            try:
+                if seg is None:
+                    with timer.stage("segmentation"):
+                        seg=self.yolo.extract_roi(bgr)
+                if isinstance(seg, Exception):
+                    raise seg
+                mask_roi, offset, cnt=seg
+            except Exception:
+                with timer.stage("segmentation_fallback"):
+                    mask_roi, offset, cnt=self.contour.extract_bgr(bgr)
+        if mask_sink is not None:
+            mask_sink(mask_roi, offset, cnt)
+        with timer.stage("outline"):
+            outline_path=self.drawer.draw_and_save(bgr, cnt, self.outlines_dir, base, writer=self.artifacts)
+        with timer.stage("rotation"):
+            # angle plus the ROI warp, which produces the crop directly
+            mask_r, rot, (y1,y2,x1,x2)=self._rotate(mask_roi, offset, cnt, bgr.shape, crop_margin, rot, need_mask=bool(debug_dir))
+        if key and not cached:
+            self.stage_cache.put(key, mask_roi, offset, cnt, rot)
         if debug_dir:
-            imwrite_safely(os.path.join(debug_dir,"01_gray.jpg"), gray)
+            mask_bin,_=paste_roi(mask_roi, offset, cnt, bgr.shape)
+            img_r,_,_=self.rot.rotate_to_vertical(bgr, mask_bin, cnt)
+            imwrite_safely(os.path.join(debug_dir,"01_gray.jpg"), cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY))
             imwrite_safely(os.path.join(debug_dir,"02_mask_raw.png"), (mask_bin*255).astype(np.uint8))
             imwrite_safely(os.path.join(debug_dir,"03_mask_rotated.png"), mask_r)
+            imwrite_safely(os.path.join(debug_dir,"04_rotated.jpg"), img_r[y1:y2+1, x1:x2+1])
         gemini_info=None
-        if mm_per_px is None and aruco_mm is not None:
+        scale_unc=None
+        ds=decode_scale
+        crop=[int(round(c/ds)) for c in (y1,y2,x1,x2)]
+        # mm_dec: mm per decoded px
+        mm_dec=mm_per_px/ds if mm_per_px is not None else None
+        if mm_dec is None and aruco_mm is not None:
             try:
-                mm_per_px=self.aruco.estimate_mm_per_px(bgr, aruco_mm)
+                with timer.stage("scale_aruco"):
+                    aru=self.aruco.estimate(bgr, aruco_mm)
+                mm_dec,scale_unc=aru["mm_per_px"],aru["uncertainty"]*ds
             except Exception:
                 pass
-        if mm_per_px is None and use_gemini:
-            vpx,hpx=self.intg.integrate_px(mask_r)
+        if mm_dec is None and use_gemini:
+            with timer.stage("integration"):
+                vpx,hpx=self._integrate(mask_r, cnt, rot)
             meta={"volume": float(vpx), "height": float(hpx), "units":{"volume":"px^3","height":"px"}, "notes":"No scale provided; pixel units.", "rotation_applied_deg": float(rot), "crop":[int(y1),int(y2),int(x1),int(x2)]}
-            gemini_info=self.gemini.estimate_mm_per_px(image_path, meta)
+            with timer.stage("scale_gemini"):
+                gemini_info=(scale_fn or self.gemini.estimate_mm_per_px)(image_path, _scale_meta(meta, 1.0/ds), data=image_bytes, timer=timer)
             if isinstance(gemini_info,dict) and gemini_info.get("mm_per_px"):
                 try:
-                    mm_per_px=float(gemini_info["mm_per_px"])
+                    mm_dec=float(gemini_info["mm_per_px"])/ds
                 except:
                     pass
-        if mm_per_px is None:
-            vpx,hpx=self.intg.integrate_px(mask_r)
-            return Result(volume=float(vpx), height=float(hpx), units={"volume":"px^3","height":"px"}, notes="No scale provided; reporting in pixel units.", rotation_applied_deg=float(rot), crop=[int(y1),int(y2),int(x1),int(x2)], outline_path=outline_path, gemini=gemini_info).model_dump()
-        vmm3,hmm=self.intg.integrate_mm(mask_r, mm_per_px, wall_mm)
+        if mm_dec is None:
+            with timer.stage("integration"):
+                vpx,hpx=self._integrate(mask_r, cnt, rot)
+            return Result(volume=float(vpx)/ds**3, height=float(hpx)/ds, units={"volume":"px^3","height":"px"}, notes="No scale provided; reporting in pixel units.", rotation_applied_deg=float(rot), crop=crop, outline_path=outline_path, gemini=gemini_info, timings=dict(timer.timings)).model_dump()
+        with timer.stage("integration"):
+            vmm3,hmm=self._integrate(mask_r, cnt, rot, mm_dec, wall_mm)
         vml=vmm3/1000.0
-        return Result(volume=float(vml), height=float(hmm), units={"volume":"mL","height":"mm"}, notes=("Inner capacity (wall subtracted)." if wall_mm>0 else "Outer volume (no wall subtraction)."), rotation_applied_deg=float(rot), crop=[int(y1),int(y2),int(x1),int(x2)], outline_path=outline_path, scale_mm_per_px=float(mm_per_px), gemini=gemini_info).model_dump()
+        return Result(volume=float(vml), height=float(hmm), units={"volume":"mL","height":"mm"}, notes=("Inner capacity (wall subtracted)." if wall_mm>0 else "Outer volume (no wall subtraction)."), rotation_applied_deg=float(rot), crop=crop, outline_path=outline_path, scale_mm_per_px=float(mm_dec*ds), scale_uncertainty_mm_per_px=scale_unc, gemini=gemini_info, timings=dict(timer.timings)).model_dump()
+    def process_frame_multi(self, bgr, image_path:str, mm_per_px:Union[float,None], aruco_mm:Union[float,None], wall_mm:float, crop_margin:int, use_gemini:bool, seg=None, image_bytes:Union[bytes,None]=None, timer:Union[StageTimer,None]=None, decode_scale:float=1.0, scale_fn=None):
+        # Every container instance from a single inference; angle, ROI warp and integration then run per instance.
+        # Result.instances lists each instance (largest first, failures carry "error"); the top-level fields
+        # describe the first measured one. seg: precomputed extract_all().
+        timer=timer or StageTimer()
+        REGISTRY.inc("frames_processed")
+        base=os.path.splitext(os.path.basename(image_path))[0]
+        try:
+            if seg is None:
+                with timer.stage("segmentation"):
+                    seg=self.yolo.extract_all(bgr, self.container_classes)
+            if isinstance(seg, Exception):
+                raise seg
+            insts=seg
+        except Exception:
+            with timer.stage("segmentation_fallback"):
+                insts=[self.contour.extract_bgr(bgr)+(None,None)]
+        cnts=[c for _,_,c,_,_ in insts]
+        with timer.stage("outline"):
+            outline_path=self.drawer.draw_and_save(bgr, cnts, self.outlines_dir, base, writer=self.artifacts)
+        with timer.stage("rotation"):
+            rots=self.rot.angles(cnts)
+            rotated=[]
+            for (roi,off,cnt,_,_),rot in zip(insts,rots):
+                try:
+                    rotated.append(self._rotate(roi, off, cnt, bgr.shape, crop_margin, float(rot)))
+                except RuntimeError as e:
+                    rotated.append(e)
+        ok=[k for k,r in enumerate(rotated) if not isinstance(r, Exception)]
+        if not ok:
+            raise RuntimeError("No instance could be measured")
+        ds=decode_scale
+        gemini_info=None
+        scale_unc=None
+        mm_dec=mm_per_px/ds if mm_per_px is not None else None
+        if mm_dec is None and aruco_mm is not None:
+            try:
+                with timer.stage("scale_aruco"):
+                    aru=self.aruco.estimate(bgr, aruco_mm)
+                mm_dec,scale_unc=aru["mm_per_px"],aru["uncertainty"]*ds
+            except Exception:
+                pass
+        if mm_dec is None and use_gemini:
+            # the scale is per frame; the request carries the first instance's pixel measurements
+            k=ok[0]
+            mask_r,rot,(y1,y2,x1,x2)=rotated[k]
+            with timer.stage("integration"):
+                vpx,hpx=self._integrate(mask_r, cnts[k], rot)
+            meta={"volume": float(vpx), "height": float(hpx), "units":{"volume":"px^3","height":"px"}, "notes":"No scale provided; pixel units.", "rotation_applied_deg": float(rot), "crop":[int(y1),int(y2),int(x1),int(x2)]}
+            with timer.stage("scale_gemini"):
+                gemini_info=(scale_fn or self.gemini.estimate_mm_per_px)(image_path, _scale_meta(meta, 1.0/ds), data=image_bytes, timer=timer)
+            if isinstance(gemini_info,dict) and gemini_info.get("mm_per_px"):
+                try:
+                    mm_dec=float(gemini_info["mm_per_px"])/ds
+                except:
+                    pass
+        with timer.stage("integration"):
+            vols,hs=self._integrate_batch([rotated[k] for k in ok], [cnts[k] for k in ok], mm_dec, wall_mm)
+        if mm_dec is None:
+            vols,hs=vols/ds**3,hs/ds
+            units={"volume":"px^3","height":"px"}
+        else:
+            vols=vols/1000.0
+            units={"volume":"mL","height":"mm"}
+        measured=dict(zip(ok, zip(vols.tolist(), hs.tolist())))
+        instances=[]
+        for k,(_,_,_,label,conf) in enumerate(insts):
+            inst={"index":k, "label":label, "confidence":conf}
+            if k not in measured or not np.isfinite(measured[k][0]):
+                inst["error"]=str(rotated[k]) if isinstance(rotated[k], Exception) else "Object too small"
+            else:
+                _,rot,crop=rotated[k]
+                inst.update({"volume":measured[k][0], "height":measured[k][1], "rotation_applied_deg":float(rot), "crop":[int(round(c/ds)) for c in crop]})
+            instances.append(inst)
+        good=[i for i in instances if "error" not in i]
+        if not good:
+            raise RuntimeError("No instance could be measured")
+        top=good[0]
+        if mm_dec is None:
+            notes=f"{len(good)} of {len(instances)} instances measured. No scale provided; reporting in pixel units."
+        else:
+            notes=f"{len(good)} of {len(instances)} instances measured. "+("Inner capacity (wall subtracted)." if wall_mm>0 else "Outer volume (no wall subtraction).")
+        return Result(volume=top["volume"], height=top["height"], units=units, notes=notes, rotation_applied_deg=top["rotation_applied_deg"], crop=top["crop"], outline_path=outline_path, scale_mm_per_px=None if mm_dec is None else float(mm_dec*ds), scale_uncertainty_mm_per_px=scale_unc, gemini=gemini_info, timings=dict(timer.timings), instances=instances).model_dump()
+    def _integrate_batch(self, rotated, cnts, mm_per_px=None, wall_mm=0.0):
+        # rotated: _rotate() results; (volumes, heights) arrays with NaN for objects too small to integrate.
+        # Per instance for either integrator (integrate_batch loops over the masks' bounding rects).
+        if self.integrator=="raster":
+            return self.intg.integrate_batch([m for m,_,_ in rotated], mm_per_px, wall_mm)
+        out=np.full((2,len(cnts)), np.nan)
+        for k,(cnt,(_,rot,_)) in enumerate(zip(cnts,rotated)):
+            try:
+                out[:,k]=self.intg.integrate_contour(cnt, mm_per_px, wall_mm, rot=rot, slices=self.integration_slices, method=self.integration_method)
+            except RuntimeError:
+                pass
+        return out[0], out[1]
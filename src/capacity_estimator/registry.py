@@ -0,0 +1,136 @@
+import os, gc, time, threading
+from collections import OrderedDict
+from typing import Union
+from .metrics import REGISTRY
+def rss_bytes():
+    # resident set size of this process (Linux); None where /proc is unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+def _path_bytes(p):
+    if os.path.isdir(p):
+        return sum(os.path.getsize(os.path.join(d,f)) for d,_,fs in os.walk(p) for f in fs)
+    return os.path.getsize(p) if os.path.isfile(p) else 0
+def model_nbytes(model):
+    # parameter + buffer bytes of a torch model (ultralytics YOLO wraps it in .model); file size for exported models
+    m=getattr(model,"model",model)
+    if hasattr(m,"parameters") and hasattr(m,"buffers"):
+        return sum(t.numel()*t.element_size() for t in list(m.parameters())+list(m.buffers()))
+    for p in (getattr(model,"ckpt_path",None), m if isinstance(m,str) else None):
+        if p and os.path.exists(p):
+            return _path_bytes(p)
+    return 0
+class ModelRegistry:
+    # Process-wide model cache: one load per key even under concurrent first use (per-key lock), least recently
+    # used models dropped once the summed sizes exceed budget_mb (the newest model always stays), optional
+    # warmup call at load. Size is the parameter/file estimate, or the RSS growth across load+warmup when the
+    # model exposes neither. Callers should look models up per use rather than keep references, or eviction
+    # cannot free them.
+    def __init__(self, budget_mb:Union[float,None]=None, warmup:bool=False):
+        self.budget=budget_mb*1024*1024 if budget_mb else None
+        self.warmup=warmup
+        self._lock=threading.Lock()
+        self._models=OrderedDict()
+        self._stats={}
+        self._key_locks={}
+    @classmethod
+    def from_settings(cls, s):
+        return cls(budget_mb=s.model_cache_mb, warmup=bool(s.model_warmup))
+    def get(self, key:str, loader, warmup=None):
+        # loader() -> model; warmup(model) runs once after loading when warmup is enabled
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self._stats[key]["hits"]+=1
+                return self._models[key]
+            klock=self._key_locks.setdefault(key, threading.Lock())
+        with klock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self._stats[key]["hits"]+=1
+                    return self._models[key]
+            rss0=rss_bytes()
+            t0=time.perf_counter()
+            model=loader()
+            t1=time.perf_counter()
+            if warmup is not None and self.warmup:
+                try:
+                    warmup(model)
+                except Exception:
+                    REGISTRY.inc("model_warmup_errors")
+            t2=time.perf_counter()
+            rss1=rss_bytes()
+            rss_delta=max(0, rss1-rss0) if rss0 is not None and rss1 is not None else None
+            size=model_nbytes(model) or rss_delta or 0
+            REGISTRY.observe("model_load", t1-t0)
+            REGISTRY.inc("model_loads")
+            with self._lock:
+                self._models[key]=model
+                self._stats[key]={"key":key, "load_s":t1-t0, "warmup_s":t2-t1, "size_bytes":size, "rss_delta_bytes":rss_delta, "hits":0, "loaded_at":time.time()}
+                evicted=self._evict()
+        if evicted:
+            # the evicted models' memory only returns once nothing references them
+            del evicted
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+        return model
+    def _evict(self):
+        evicted=[]
+        if self.budget is None:
+            return evicted
+        while len(self._models)>1 and sum(self._stats[k]["size_bytes"] for k in self._models)>self.budget:
+            k,m=self._models.popitem(last=False)
+            self._stats.pop(k)
+            self._key_locks.pop(k, None)
+            evicted.append(m)
+            REGISTRY.inc("model_evictions")
+        return evicted
+    def evict(self, key:str):
+        with self._lock:
+            self._stats.pop(key, None)
+            self._key_locks.pop(key, None)
+            return self._models.pop(key, None) is not None
+    def clear(self):
+        with self._lock:
+            self._models.clear(); self._stats.clear(); self._key_locks.clear()
+        gc.collect()
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._models
+    def stats(self):
+        # one dict per resident model, least recently used first, plus the process RSS
+        with self._lock:
+            models=[dict(self._stats[k]) for k in self._models]
+        total=sum(m["size_bytes"] for m in models)
+        return {"models":models, "total_bytes":total, "budget_bytes":self.budget, "rss_bytes":rss_bytes()}
+_registry=None
+_registry_lock=threading.Lock()
+def get_registry() -> ModelRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from .config import get_settings
+            _registry=ModelRegistry.from_settings(get_settings())
+        return _registry
+def enable_warmup() -> ModelRegistry:
+    # long-running processes (server, pool workers) pay the warmup once at startup instead of on the first
+    # request; an explicit MODEL_WARMUP still wins
+    from .config import get_settings
+    reg=get_registry()
+    if get_settings().model_warmup is None:
+        reg.warmup=True
+    return reg
+def yolo_warmup(imgsz:int=640):
+    # one predict on a blank frame: builds the predictor, allocates buffers and compiles/initialises the backend
+    def run(model):
+        import numpy as np
+        model.predict(np.zeros((imgsz,imgsz,3),np.uint8), imgsz=imgsz, verbose=False)
+    return run
@@ -1,3 +1,3 @@
 from .aruco import ArucoScaleEstimator
-from .gemini import GeminiScaleEstimator
-__all__=["ArucoScaleEstimator","GeminiScaleEstimator"]
+from .gemini import GeminiScaleEstimator, UploadPolicy
+__all__=["ArucoScaleEstimator","GeminiScaleEstimator","UploadPolicy"]
@@ -1,17 +1,102 @@
-import cv2, numpy as np
+import threading, cv2, numpy as np
+from concurrent.futures import ThreadPoolExecutor
 class ArucoScaleEstimator:
-    def estimate_mm_per_px(self, bgr, marker_mm, dict_name=None):
+    # Markers are found on a downscaled copy (long side <= coarse_max_side) and their corners re-detected at
+    # full resolution inside a padded ROI around each candidate; falls back to a full-frame pass when the
+    # coarse pass finds nothing (markers too small). The scale is the median over all markers.
+    def __init__(self, dict_name=None, coarse_max_side=1280, roi_pad=0.25, corner_sigma_px=0.5, workers=4):
+        self.dict_name=dict_name
+        self.corner_sigma_px=corner_sigma_px
+        self.coarse_max_side=coarse_max_side
+        self.roi_pad=roi_pad
+        self.workers=workers
+        self._local=threading.local()
+        self._lock=threading.Lock()
+        self._pool=None
+    def _detector(self, dict_name):
+        # ArucoDetector is not thread-safe, so one per (thread, dictionary), freed with the thread; pre-4.7 OpenCV
+        # gets a callable around detectMarkers
+        dets=self._local.__dict__.setdefault("detectors", {})
+        det=dets.get(dict_name)
+        if det is None:
+            ad=cv2.aruco.getPredefinedDictionary(dict_name)
+            if hasattr(cv2.aruco, "ArucoDetector"):
+                params=cv2.aruco.DetectorParameters()
+                params.cornerRefinementMethod=cv2.aruco.CORNER_REFINE_SUBPIX
+                det=cv2.aruco.ArucoDetector(ad, params).detectMarkers
+            else:
+                params=cv2.aruco.DetectorParameters_create()
+                params.cornerRefinementMethod=cv2.aruco.CORNER_REFINE_SUBPIX
+                det=lambda img: cv2.aruco.detectMarkers(img, ad, parameters=params)
+            dets[dict_name]=det
+        return det
+    def detect(self, gray, dict_name=None):
+        # [(id, corners 4x2 float32 in full-frame px)]
         if not hasattr(cv2, "aruco"):
             raise RuntimeError("opencv-contrib missing for ArUco")
         if dict_name is None:
-            dict_name=cv2.aruco.DICT_5X5_100
-        gray=cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-        ad=cv2.aruco.getPredefinedDictionary(dict_name)
-        corners, ids, _=cv2.aruco.detectMarkers(gray, ad)
-        if ids is None or len(corners)==0:
+            dict_name=cv2.aruco.DICT_5X5_100 if self.dict_name is None else self.dict_name
+        det=self._detector(dict_name)
+        h,w=gray.shape[:2]
+        s=min(1.0, self.coarse_max_side/max(h,w)) if self.coarse_max_side else 1.0
+        if s<1.0:
+            small=cv2.resize(gray,(max(1,round(w*s)),max(1,round(h*s))),interpolation=cv2.INTER_AREA)
+            corners,ids,_=det(small)
+            if ids is not None and len(corners):
+                out=[]
+                for c,i in zip(corners,ids.ravel()):
+                    c=c.reshape(4,2)/s
+                    pad=self.roi_pad*np.ptp(c,axis=0).max()
+                    x0,y0=np.maximum(np.floor(c.min(0)-pad).astype(int),0)
+                    x1,y1=np.minimum(np.ceil(c.max(0)+pad).astype(int),[w,h])
+                    rc,rids,_=det(np.ascontiguousarray(gray[y0:y1,x0:x1]))
+                    if rids is not None and int(i) in rids.ravel():
+                        c=rc[list(rids.ravel()).index(int(i))].reshape(4,2)+np.array([x0,y0],np.float32)
+                    out.append((int(i), c.astype(np.float32)))
+                return out
+        corners,ids,_=det(gray)
+        if ids is None:
+            return []
+        return [(int(i), c.reshape(4,2).astype(np.float32)) for c,i in zip(corners,ids.ravel())]
+    def estimate(self, bgr, marker_mm, dict_name=None):
+        # {"mm_per_px", "uncertainty" (1 sigma, mm/px), "n_markers", "ids", "per_marker"}
+        gray=bgr if bgr.ndim==2 else cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        found=self.detect(gray, dict_name)
+        if not found:
             raise RuntimeError("No ArUco marker detected")
-        per=[cv2.arcLength(c.reshape(-1,2), True) for c in corners]
-        idx=int(np.argmax(per))
-        c=corners[idx].reshape(4,2)
-        side=np.mean([np.linalg.norm(c[1]-c[0]), np.linalg.norm(c[2]-c[1]), np.linalg.norm(c[3]-c[2]), np.linalg.norm(c[0]-c[3])])
-        return marker_mm/side
+        c=np.stack([m[1] for m in found])
+        edges=np.linalg.norm(c-np.roll(c,-1,axis=1),axis=2)
+        per=marker_mm/edges.mean(1)
+        est=float(np.median(per))
+        if len(per)>=3:
+            unc=1.4826*float(np.median(np.abs(per-est)))/np.sqrt(len(per))
+        else:
+            # too few markers for a MAD: edge-length spread within each marker plus corner localisation noise
+            rel=np.hypot(edges.std(1), self.corner_sigma_px)/edges.mean(1)
+            unc=float(np.max(per*rel))/np.sqrt(len(per))
+        return {"mm_per_px":est, "uncertainty":unc, "n_markers":len(per), "ids":[m[0] for m in found], "per_marker":per.tolist()}
+    def estimate_mm_per_px(self, bgr, marker_mm, dict_name=None):
+        return self.estimate(bgr, marker_mm, dict_name)["mm_per_px"]
+    @property
+    def pool(self):
+        # one bounded pool for the estimator's lifetime, so its threads (and their detectors) are reused across batches
+        with self._lock:
+            if self._pool is None:
+                self._pool=ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="aruco")
+            return self._pool
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool=None
+    def estimate_batch(self, frames, marker_mm, dict_name=None):
+        # one dict per frame, {"error": ...} when no marker is found; OpenCV releases the GIL so frames run on a thread pool
+        def one(f):
+            try:
+                return self.estimate(f, marker_mm, dict_name)
+            except Exception as e:
+                return {"error":str(e)}
+        frames=list(frames)
+        if len(frames)<=1 or self.workers<=1:
+            return [one(f) for f in frames]
+        return list(self.pool.map(one, frames))
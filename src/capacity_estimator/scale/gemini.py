@@ -1,29 +1,115 @@
-import json, mimetypes
-from google import genai
-from google.genai import types
+import json, mimetypes, hashlib, os, threading, cv2, numpy as np
+from collections import OrderedDict
 from pydantic import BaseModel
 from ..models import ScaleEstimate
+from ..metrics import timed
 from typing import Union
+PROMPT_VERSION="scale-v1"
+class UploadPolicy(BaseModel):
+    max_side: Union[int, None]=1536
+    max_bytes: Union[int, None]=None
+    jpeg_quality: int=85
+def prepare_upload(data: bytes, mime: str, policy: UploadPolicy):
+    # Returns (bytes, mime, scale) where scale = uploaded px / original px.
+    if policy.max_side is None and (policy.max_bytes is None or len(data)<=policy.max_bytes):
+        return data, mime, 1.0
+    img=cv2.imdecode(np.frombuffer(data,np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return data, mime, 1.0
+    h,w=img.shape[:2]
+    s=min(1.0, policy.max_side/max(h,w)) if policy.max_side else 1.0
+    if s==1.0 and (policy.max_bytes is None or len(data)<=policy.max_bytes):
+        return data, mime, 1.0
+    q=policy.jpeg_quality
+    while True:
+        small=cv2.resize(img,(max(1,round(w*s)),max(1,round(h*s))),interpolation=cv2.INTER_AREA) if s<1.0 else img
+        ok,buf=cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, q])
+        out=buf.tobytes()
+        if policy.max_bytes is None or len(out)<=policy.max_bytes or max(small.shape[:2])<=64:
+            return out, "image/jpeg", small.shape[1]/w
+        if q>50:
+            q-=15
+        else:
+            s*=0.75
+def _scale_meta(meta: dict, s: float):
+    if s==1.0 or not isinstance(meta,dict) or meta.get("units",{}).get("height")!="px":
+        return meta
+    m=dict(meta)
+    if "volume" in m: m["volume"]=float(m["volume"])*s**3
+    if "height" in m: m["height"]=float(m["height"])*s
+    if "crop" in m: m["crop"]=[int(round(c*s)) for c in m["crop"]]
+    return m
 class GeminiScaleEstimator:
-    def __init__(self, api_key: Union[str, None], model: str):
+    def __init__(self, api_key: Union[str, None], model: str, upload_policy: Union[UploadPolicy, None]=None, cache_dir: Union[str, None]=None, cache_size: int=256):
         self.api_key=api_key
         self.model=model
-    def estimate_mm_per_px(self, image_path: str, meta: dict):
+        self.upload_policy=upload_policy or UploadPolicy()
+        self.cache_dir=cache_dir
+        self.cache_size=cache_size
+        self._cache=OrderedDict()
+        self._client=None
+        self._lock=threading.Lock()
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from google import genai
+                self._client=genai.Client(api_key=self.api_key)
+            return self._client
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return dict(self._cache[key])
+        if self.cache_dir:
+            p=os.path.join(self.cache_dir,key+".json")
+            if os.path.exists(p):
+                try:
+                    with open(p) as f:
+                        d=json.load(f)
+                    self._cache_put(key, d, persist=False)
+                    return d
+                except Exception:
+                    pass
+        return None
+    def _cache_put(self, key, d, persist=True):
+        with self._lock:
+            self._cache[key]=dict(d)
+            self._cache.move_to_end(key)
+            while len(self._cache)>self.cache_size:
+                self._cache.popitem(last=False)
+        if persist and self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp=os.path.join(self.cache_dir,key+".json.tmp")
+            with open(tmp,"w") as f:
+                json.dump(d,f)
+            os.replace(tmp, os.path.join(self.cache_dir,key+".json"))
+    def estimate_mm_per_px(self, image_path: str, meta: dict, data: Union[bytes, None]=None, timer=None):
         if not self.api_key:
             return {"error":"No GEMINI_API_KEY configured"}
         try:
-            client=genai.Client(api_key=self.api_key)
             mime=mimetypes.guess_type(image_path)[0] or "image/jpeg"
-            with open(image_path,"rb") as f:
-                data=f.read()
-            part=types.Part.from_bytes(data=data, mime_type=mime)
+            if data is None:
+                with open(image_path,"rb") as f:
+                    data=f.read()
+            with timed(timer, "gemini_upload_prep"):
+                up,up_mime,s=prepare_upload(data, mime, self.upload_policy)
+            meta_up=_scale_meta(meta, s)
             prompt=("You are a metrology assistant. Estimate a plausible pixel-to-metric scale for the container/bottle in the provided image.\n"
                     "Use the following metadata from a solid-of-revolution integration result:\n"
-                    +json.dumps(meta,indent=2)+
+                    +json.dumps(meta_up,indent=2)+
                     "\nIf you can identify any reference of known size in the image (ruler, coin, A4/letter paper, cap standards, labels, ArUco), prefer that and output mm_per_px. "
                     "If no reliable reference is visible, provide your best estimate with assumptions; else set can_estimate=false. "
                     "Return only JSON with keys: can_estimate, mm_per_px, method, confidence, rationale, assumptions.")
-            resp=client.models.generate_content(model=self.model, contents=[part, prompt], config={"response_mime_type":"application/json","response_schema":ScaleEstimate})
+            key=hashlib.sha256(b"|".join([hashlib.sha256(data).digest(), self.model.encode(), PROMPT_VERSION.encode(), self.upload_policy.model_dump_json().encode(), prompt.encode()])).hexdigest()
+            cached=self._cache_get(key)
+            if cached is not None:
+                cached["cached"]=True
+                return cached
+            from google.genai import types
+            part=types.Part.from_bytes(data=up, mime_type=up_mime)
+            with timed(timer, "gemini_request"):
+                resp=self.client.models.generate_content(model=self.model, contents=[part, prompt], config={"response_mime_type":"application/json","response_schema":ScaleEstimate})
             try:
                 parsed=resp.parsed
                 d=parsed.model_dump()
@@ -39,7 +125,12 @@ class GeminiScaleEstimator:
                     v=float(v)
                 except:
                     v=None
+            if v is not None and s!=1.0:
+                d["mm_per_px_upload"]=v
+                v=v*s
             d["mm_per_px"]=v
+            d["upload_scale"]=s
+            self._cache_put(key, d)
             return d
         except Exception as e:
             return {"error":str(e)}
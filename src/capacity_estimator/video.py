@@ -0,0 +1,116 @@
+import os, glob, cv2, numpy as np
+from typing import Union
+from .image_io import IMAGE_EXTS, read_image
+from .metrics import StageTimer
+THUMB_W=160
+def iter_frames(source:str, stride:int=1):
+    # (index, name, bgr) from a video file/stream URL, a directory of frames or a glob of frames
+    if os.path.isdir(source) or any(c in source for c in "*?["):
+        pattern=os.path.join(source,"*") if os.path.isdir(source) else source
+        paths=sorted(p for p in glob.glob(pattern) if p.lower().endswith(IMAGE_EXTS))
+        for i,p in enumerate(paths[::max(1,stride)]):
+            _,bgr=read_image(p)
+            if bgr is not None:
+                yield i*max(1,stride), os.path.basename(p), bgr
+        return
+    cap=cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not cap.isOpened():
+        raise FileNotFoundError(source)
+    try:
+        i=0
+        while True:
+            if i%max(1,stride):
+                if not cap.grab():
+                    break
+                i+=1
+                continue
+            ok,bgr=cap.read()
+            if not ok:
+                break
+            yield i, f"frame_{i:06d}", bgr
+            i+=1
+    finally:
+        cap.release()
+def thumbnail(bgr):
+    h,w=bgr.shape[:2]
+    s=THUMB_W/w
+    return cv2.resize(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY),(THUMB_W,max(1,round(h*s))),interpolation=cv2.INTER_AREA).astype(np.float32), s
+def mask_iou(a, b):
+    # IoU of two (mask_roi, (x0,y0)) masks in frame coordinates without materialising full frames
+    (ma,(ax,ay)),(mb,(bx,by))=a,b
+    x0,y0=min(ax,bx),min(ay,by)
+    x1,y1=max(ax+ma.shape[1],bx+mb.shape[1]),max(ay+ma.shape[0],by+mb.shape[0])
+    ca=np.zeros((y1-y0,x1-x0),bool); cb=np.zeros_like(ca)
+    ca[ay-y0:ay-y0+ma.shape[0], ax-x0:ax-x0+ma.shape[1]]=ma>0
+    cb[by-y0:by-y0+mb.shape[0], bx-x0:bx-x0+mb.shape[1]]=mb>0
+    union=np.count_nonzero(ca|cb)
+    return float(np.count_nonzero(ca&cb))/union if union else 0.0
+class VideoCapacityRunner:
+    # Segments only on keyframes (every keyframe_interval frames, or when the thumbnail difference to the
+    # last keyframe exceeds scene_threshold). In between, the last mask/contour is shifted by the
+    # phase-correlation translation of the thumbnails. Volumes are EMA-smoothed; the smoother is reset
+    # when a keyframe mask overlaps the propagated one by less than iou_threshold (a new object).
+    def __init__(self, pipeline, keyframe_interval:int=30, scene_threshold:float=12.0, iou_threshold:float=0.6, smoothing:float=0.3):
+        self.pipe=pipeline
+        self.keyframe_interval=keyframe_interval
+        self.scene_threshold=scene_threshold
+        self.iou_threshold=iou_threshold
+        self.smoothing=smoothing
+    def run(self, frames, mm_per_px:Union[float,None], aruco_mm:Union[float,None], wall_mm:float, crop_margin:int, write_outlines:bool=False):
+        key_thumb=prev_thumb=None
+        last_key=-10**9
+        state=None   # (mask_roi, (x0,y0), cnt, rot) of the last keyframe
+        prop_offset=None
+        meas=None
+        shift=np.zeros(2)
+        smoothed=None
+        for i,name,bgr in frames:
+            timer=StageTimer()
+            with timer.stage("scene_check"):
+                thumb,s=thumbnail(bgr)
+                diff=float(np.mean(np.abs(thumb-key_thumb))) if key_thumb is not None and key_thumb.shape==thumb.shape else None
+            keyframe=state is None or diff is None or i-last_key>=self.keyframe_interval or diff>self.scene_threshold
+            out={"frame":i, "name":name, "keyframe":keyframe, "scene_diff":diff}
+            try:
+                if keyframe:
+                    with timer.stage("segmentation"):
+                        mask_roi,offset,cnt=self.pipe.segment(bgr)
+                    iou=mask_iou((mask_roi,offset),(state[0],prop_offset)) if state is not None else None
+                    out["mask_iou"]=iou
+                    if iou is not None and iou<self.iou_threshold:
+                        smoothed=None
+                    scale=mm_per_px
+                    if scale is None and aruco_mm is not None:
+                        try:
+                            with timer.stage("scale_aruco"):
+                                scale=self.pipe.aruco.estimate_mm_per_px(bgr, aruco_mm)
+                        except Exception:
+                            scale=None
+                    with timer.stage("measure"):
+                        meas=self.pipe.measure(bgr.shape, mask_roi, offset, cnt, scale, wall_mm, crop_margin)
+                    state=(mask_roi, offset, cnt, meas["rotation_applied_deg"])
+                    prop_offset=offset
+                    key_thumb=prev_thumb=thumb
+                    last_key=i
+                    shift=np.zeros(2)
+                    v=meas["volume"]
+                    smoothed=v if smoothed is None else self.smoothing*v+(1-self.smoothing)*smoothed
+                else:
+                    with timer.stage("propagate"):
+                        (dx,dy),_=cv2.phaseCorrelate(prev_thumb, thumb)
+                        shift+=np.array([dx,dy])/s
+                        prev_thumb=thumb
+                        d=np.round(shift).astype(int)
+                        offset=prop_offset=(state[1][0]+int(d[0]), state[1][1]+int(d[1]))
+                        cnt=state[2]+d.reshape(1,1,2).astype(state[2].dtype)
+                out.update(meas)
+                out["source_frame"]=last_key
+                out["offset"]=[int(offset[0]),int(offset[1])]
+                out["volume_smoothed"]=float(smoothed)
+                if write_outlines:
+                    out["outline_path"]=self.pipe.drawer.draw_and_save(bgr, cnt, self.pipe.outlines_dir, os.path.splitext(name)[0], writer=self.pipe.artifacts)
+            except Exception as e:
+                out["error"]=str(e)
+                state=None
+            out["timings"]=dict(timer.timings)
+            yield out
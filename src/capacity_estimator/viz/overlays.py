@@ -1,9 +1,17 @@
-import os, cv2
+import os, cv2, numpy as np
+from ..artifacts import ArtifactWriter, downscale
+_sync_writer=ArtifactWriter("sync")
 class OutlineDrawer:
-    def draw_and_save(self, bgr, cnt, out_dir, base):
-        os.makedirs(out_dir, exist_ok=True)
-        out=bgr.copy()
-        cv2.drawContours(out,[cnt],-1,(0,255,0),2)
-        p=os.path.join(out_dir,f"{base}_outline.png")
-        cv2.imwrite(p,out)
-        return p
+    def draw_and_save(self, bgr, cnt, out_dir, base, writer=None):
+        # cnt: one contour or a list of them (multi-instance results)
+        writer=writer or _sync_writer
+        cnts=list(cnt) if isinstance(cnt,(list,tuple)) else [cnt]
+        if not writer.sample():
+            return None
+        def render():
+            out,s=downscale(bgr, writer.preview_max_side)
+            out=out.copy() if s==1.0 else out
+            cs=cnts if s==1.0 else [np.round(c*s).astype(np.int32) for c in cnts]
+            cv2.drawContours(out,cs,-1,(0,255,0),2)
+            return out
+        return writer.submit(os.path.join(out_dir,f"{base}_outline.png"), render)
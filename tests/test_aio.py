@@ -0,0 +1,33 @@
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
+from capacity_estimator.aio import ApiLimiter
+def _run(coro, default_workers):
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=default_workers))
+        return await asyncio.wait_for(coro(), 10)
+    return asyncio.run(main())
+def test_callers_filling_the_default_executor_do_not_deadlock():
+    # every caller is a blocked default-executor thread, as pipeline stages calling scale_fn are
+    lim=ApiLimiter(concurrency=2, timeout=1.0, retries=1, backoff=0.01)
+    async def go():
+        loop=asyncio.get_running_loop()
+        return await asyncio.gather(*[asyncio.to_thread(lim.call_from_thread, loop, lambda i=i: (time.sleep(0.02), i)[1]) for i in range(8)])
+    assert _run(go, default_workers=4)==list(range(8))
+def test_timed_out_calls_release_their_permits():
+    lim=ApiLimiter(concurrency=2, timeout=0.05, retries=0)
+    async def go():
+        loop=asyncio.get_running_loop()
+        slow=[asyncio.to_thread(lim.call_from_thread, loop, time.sleep, 0.3) for _ in range(4)]
+        res=await asyncio.gather(*slow, return_exceptions=True)
+        assert all(isinstance(r, asyncio.TimeoutError) for r in res)
+        # the sleeps finish and hand their permits back; new calls get through
+        return await asyncio.gather(*[lim.call(lambda: 1, timeout=2.0) for _ in range(4)])
+    assert _run(go, default_workers=4)==[1]*4
+def test_retry_if_retries_then_returns_last_result():
+    lim=ApiLimiter(concurrency=1, timeout=1.0, retries=2, backoff=0.01)
+    calls=[]
+    def fn():
+        calls.append(1)
+        return {"error":"busy"} if len(calls)<3 else {"mm_per_px":0.1}
+    assert asyncio.run(lim.call(fn, retry_if=lambda r: "error" in r))=={"mm_per_px":0.1}
+    assert len(calls)==3